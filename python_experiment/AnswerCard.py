@@ -1,29 +1,24 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import numpy as np
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinter import ttk
-from PIL import Image, ImageTk
-import imutils
+
+
+# 兼容不同 OpenCV 版本 findContours 的返回值，取出轮廓列表
+def grab_contours(cnts):
+    return cnts[0] if len(cnts) == 2 else cnts[1]
 
 
 # 显示图像到 Tkinter UI
 def show_preview(image, title=""):
-    max_width, max_height = 600, 400
-    height, width = image.shape[:2]
-    scale = min(max_width / width, max_height / height, 1.0)
-    new_width = int(width * scale)
-    new_height = int(height * scale)
-    resized_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-    if len(resized_image.shape) == 3:  # 彩色图像
-        image_rgb = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB)
-    else:  # 灰度图像
-        image_rgb = resized_image
-    pil_image = Image.fromarray(image_rgb)
-    tk_image = ImageTk.PhotoImage(pil_image)
-    img_label.config(image=tk_image)
-    img_label.image = tk_image
-    img_label_title.config(text=title)
+    preview.show(image, title)
 
 
 # 图像预处理（灰度化、模糊化、边缘检测）
@@ -34,8 +29,19 @@ def preprocess_image(img):
     return edged
 
 
-# 四点透视变换
-def four_point_transform(image, pts):
+# 查找答题卡外轮廓（面积最大的四边形）
+def find_document_contour(edged):
+    cnts = grab_contours(cv2.findContours(edged.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
+    for c in sorted(cnts, key=cv2.contourArea, reverse=True):
+        peri = cv2.arcLength(c, True)
+        approx = cv2.approxPolyDP(c, 0.02 * peri, True)
+        if len(approx) == 4:
+            return approx
+    return None
+
+
+# 四点透视变换，size=(宽, 高) 时直接变换到固定尺寸
+def four_point_transform(image, pts, size=None):
     rect = order_points(pts)
     (tl, tr, br, bl) = rect
 
@@ -46,6 +52,8 @@ def four_point_transform(image, pts):
     height_a = np.sqrt(((tr[0] - br[0]) ** 2) + ((tr[1] - br[1]) ** 2))
     height_b = np.sqrt(((tl[0] - bl[0]) ** 2) + ((tl[1] - bl[1]) ** 2))
     max_height = max(int(height_a), int(height_b))
+    if size is not None:
+        max_width, max_height = size
 
     dst = np.array([
         [0, 0],
@@ -72,47 +80,246 @@ def order_points(pts):
     return rect
 
 
-# 检测答题卡的被涂区域
-def detect_answers(image):
-    # 自适应二值化
-    thresh = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+# 一次性统计所有气泡内的涂黑像素数
+def score_bubbles(thresh, cnts):
+    """把所有气泡画进同一张标签图（只覆盖气泡所在的包围区域），用 bincount 一次得到每个气泡的前景像素数"""
+    if not cnts:
+        return np.zeros(0, dtype=np.int64)
+    x0, y0, w, h = cv2.boundingRect(np.vstack(cnts))
+    labels = np.zeros((h, w), dtype=np.int32)
+    for i, c in enumerate(cnts):
+        cv2.drawContours(labels, [c], -1, i + 1, -1, offset=(-x0, -y0))
+    filled = thresh[y0:y0 + h, x0:x0 + w] > 0
+    return np.bincount(labels[filled], minlength=len(cnts) + 1)[1:]
 
-    # 检测轮廓
+
+# 筛选气泡轮廓并按行分组
+def find_bubbles(thresh, options=5, min_size=20, max_size=50):
+    """返回气泡轮廓、外接矩形以及按行（行内按列）排好的轮廓下标"""
     cnts = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    cnts = imutils.grab_contours(cnts)
+    cnts = grab_contours(cnts)
 
     # 答题卡的区域筛选
     question_cnts = []
+    boxes = []
     for c in cnts:
         (x, y, w, h) = cv2.boundingRect(c)
         aspect_ratio = w / float(h)
-        if 20 <= w <= 50 and 20 <= h <= 50 and 0.9 <= aspect_ratio <= 1.1:
+        if min_size <= w <= max_size and min_size <= h <= max_size and 0.9 <= aspect_ratio <= 1.1:
             question_cnts.append(c)
+            boxes.append((x, y, w, h))
 
-    # 根据位置排序
-    question_cnts = sorted(question_cnts, key=lambda x: cv2.boundingRect(x)[1])
+    # 根据位置排序（先按行，再在每行内按列）
+    order = sorted(range(len(question_cnts)), key=lambda k: boxes[k][1])
+    rows = []
+    for i in range(0, len(order), options):
+        rows.append(sorted(order[i:i + options], key=lambda k: boxes[k][0]))
+    return question_cnts, boxes, rows
 
-    answers = []
-    for i in range(0, len(question_cnts), 5):
-        row = sorted(question_cnts[i:i + 5], key=lambda x: cv2.boundingRect(x)[0])
-        answers.append(row)
 
-    result = []
-    for row in answers:
-        bubbled = None
-        for j, c in enumerate(row):
+# 检测答题卡的被涂区域
+def detect_answers(image, options=5):
+    # 自适应二值化
+    thresh = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    question_cnts, _, rows = find_bubbles(thresh, options)
+
+    # 统计涂黑像素，每行取最大者
+    totals = score_bubbles(thresh, question_cnts)
+    return [int(np.argmax(totals[row])) for row in rows]
+
+
+# 答题卡版式模板
+class AnswerLayout:
+    """固定版式的答题卡：透视校正后的尺寸、每行选项数、各气泡圆心与半径。
+
+    版式只需从一张参考答题卡登记一次并保存为 JSON，之后每张答题卡只做透视变换和固定区域采样，
+    不再逐张查找气泡轮廓。
+    """
+
+    def __init__(self, size, options, centers, radius):
+        self.size = (int(size[0]), int(size[1]))  # 透视校正后的 (宽, 高)
+        self.options = int(options)
+        self.centers = np.asarray(centers, dtype=np.float32).reshape(-1, self.options, 2)
+        self.radius = float(radius)
+        self._labels = None
+
+    @property
+    def rows(self):
+        return self.centers.shape[0]
+
+    @classmethod
+    def register(cls, image, options=5, min_size=20, max_size=50):
+        """从参考答题卡（BGR 图像）登记版式"""
+        warped = warp_sheet(image)
+        thresh = cv2.threshold(warped, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+        _, boxes, rows = find_bubbles(thresh, options, min_size, max_size)
+        if not rows or len(rows[-1]) != options:
+            raise ValueError(f"检测到的气泡数量不是每行 {options} 个选项的整数倍")
+        centers = [[(boxes[k][0] + boxes[k][2] / 2, boxes[k][1] + boxes[k][3] / 2) for k in row] for row in rows]
+        radius = np.median([min(w, h) for (_, _, w, h) in boxes]) / 2
+        return cls((warped.shape[1], warped.shape[0]), options, centers, radius)
+
+    def save(self, path):
+        data = {"size": list(self.size), "options": self.options,
+                "radius": self.radius, "centers": self.centers.round(2).tolist()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["size"], data["options"], data["centers"], data["radius"])
+
+    def labels(self):
+        """气泡标签图（0 为背景，k + 1 为第 k 个气泡），首次使用时生成"""
+        if self._labels is None:
+            labels = np.zeros((self.size[1], self.size[0]), dtype=np.int32)
+            for k, (x, y) in enumerate(self.centers.reshape(-1, 2)):
+                cv2.circle(labels, (int(round(x)), int(round(y))), int(round(self.radius)), k + 1, -1)
+            self._labels = labels
+        return self._labels
+
+    def detect_answers(self, warped):
+        """在按版式尺寸校正后的灰度答题卡上采样每个气泡，返回每行涂黑的选项"""
+        thresh = cv2.threshold(warped, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+        totals = np.bincount(self.labels()[thresh > 0], minlength=self.centers.shape[0] * self.options + 1)[1:]
+        return np.argmax(totals.reshape(-1, self.options), axis=1).tolist()
+
+
+# 定位答题卡并透视校正为灰度图
+def warp_sheet(img, size=None):
+    doc_cnt = find_document_contour(preprocess_image(img))
+    if doc_cnt is None:
+        raise ValueError("无法找到答题卡区域")
+    return four_point_transform(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), doc_cnt.reshape(4, 2), size)
+
+
+# 工作进程中使用的版式（由 _init_worker 加载）
+_worker_layout = None
+
+
+def _init_worker(layout_path):
+    global _worker_layout
+    _worker_layout = AnswerLayout.load(layout_path) if layout_path else None
+
+
+# 识别单张答题卡（批处理的工作进程入口）
+def grade_sheet(file_path, layout=None):
+    """读取并识别一张答题卡，出错时记录错误信息而不是抛出异常"""
+    layout = layout or _worker_layout
+    try:
+        img = cv2.imread(file_path, cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("无法读取图片")
+        if layout is not None:
+            answers = layout.detect_answers(warp_sheet(img, layout.size))
+        else:
+            answers = detect_answers(warp_sheet(img))
+        return {"file": file_path, "status": "ok", "answers": answers, "error": ""}
+    except Exception as e:
+        return {"file": file_path, "status": "error", "answers": [], "error": str(e)}
+
+
+# 展开目录或通配符为图片列表
+def collect_sheets(source):
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)
+                 if name.lower().endswith((".jpg", ".png", ".bmp"))]
+    else:
+        paths = glob.glob(source)
+    return sorted(paths)
+
+
+# 批量识别答题卡，逐行写出结果
+def batch_grade(source, output, workers=None, layout_path=None):
+    """用进程池识别目录/通配符下的所有答题卡，结果按 output 的扩展名逐行写入：
+    .jsonl 每行一个 JSON 对象，.json 为一个 JSON 数组（全部写完后才是完整的 JSON），其余为 CSV。
+
+    给出 layout_path 时每个工作进程只加载一次版式，按固定气泡位置采样。
+    """
+    paths = collect_sheets(source)
+    if not paths:
+        raise ValueError(f"没有找到答题卡图片：{source}")
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (workers * 4))
+    extension = os.path.splitext(output)[1].lower()
+    done = failed = 0
+    start = time.perf_counter()
+
+    with open(output, "w", newline="", encoding="utf-8") as f, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                                            initargs=(layout_path,)) as pool:
+        writer = None if extension in (".jsonl", ".json") else csv.DictWriter(f, fieldnames=["file", "status", "answers", "error"])
+        if writer is not None:
+            writer.writeheader()
+        elif extension == ".json":
+            f.write("[")
+        for row in pool.map(grade_sheet, paths, chunksize=chunksize):
+            if extension == ".jsonl":
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            elif extension == ".json":
+                f.write(("\n" if done == 0 else ",\n") + json.dumps(row, ensure_ascii=False))
+            else:
+                writer.writerow(dict(row, answers=" ".join(map(str, row["answers"]))))
+            f.flush()
+            done += 1
+            failed += row["status"] != "ok"
+        if extension == ".json":
+            f.write("\n]\n")
+
+    elapsed = time.perf_counter() - start
+    rate = done / elapsed if elapsed > 0 else float("inf")
+    print(f"共处理 {done} 张答题卡，失败 {failed} 张，用时 {elapsed:.2f} 秒，{rate:.1f} 张/秒", file=sys.stderr)
+    return done, failed
+
+
+# 生成一张密集的合成答题卡（已透视校正的灰度图）
+def make_synthetic_sheet(rows=120, options=5, seed=0):
+    rng = np.random.default_rng(seed)
+    pitch, radius, margin = 40, 14, 30
+    sheet = np.full((margin * 2 + rows * pitch, margin * 2 + options * pitch), 255, dtype=np.uint8)
+    answers = rng.integers(0, options, rows).tolist()
+    for r, a in enumerate(answers):
+        for j in range(options):
+            center = (margin + j * pitch + pitch // 2, margin + r * pitch + pitch // 2)
+            cv2.circle(sheet, center, radius, 0, -1 if j == a else 2)
+    return sheet, answers
+
+
+# 对比逐气泡掩码与标签图两种计分方式的耗时
+def benchmark_scoring(rows=120, repeat=5):
+    sheet, expected = make_synthetic_sheet(rows)
+    thresh = cv2.threshold(sheet, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    cnts = grab_contours(cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
+
+    def masked_totals():
+        totals = []
+        for c in cnts:
             mask = np.zeros(thresh.shape, dtype="uint8")
             cv2.drawContours(mask, [c], -1, 255, -1)
-            total = cv2.countNonZero(cv2.bitwise_and(thresh, thresh, mask=mask))
-            if bubbled is None or total > bubbled[0]:
-                bubbled = (total, j)
-        result.append(bubbled[1])
+            totals.append(cv2.countNonZero(cv2.bitwise_and(thresh, thresh, mask=mask)))
+        return np.array(totals)
 
-    return result
+    timings, results = {}, {}
+    for name, fn in (("masked", masked_totals), ("labels", lambda: score_bubbles(thresh, cnts))):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            results[name] = fn()
+        timings[name] = (time.perf_counter() - start) / repeat
+
+    assert np.array_equal(results["masked"], results["labels"])
+    assert detect_answers(sheet) == expected
+    old, new = timings["masked"], timings["labels"]
+    print(f"{rows} 题 × 5 选项：逐气泡掩码 {old * 1000:.1f} ms，标签图 {new * 1000:.1f} ms，加速 {old / new:.1f} 倍")
 
 
 # Tkinter 主界面
 def main_ui():
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    from preview import ImagePreview
+
     global current_image
     current_image = None
 
@@ -138,23 +345,8 @@ def main_ui():
             messagebox.showwarning("警告", "请先加载图片")
             return
         try:
-            # 图像预处理
-            edged = preprocess_image(current_image)
-
             # 检测并提取答题卡
-            cnts = imutils.grab_contours(cv2.findContours(edged.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
-            doc_cnt = None
-            for c in sorted(cnts, key=cv2.contourArea, reverse=True):
-                peri = cv2.arcLength(c, True)
-                approx = cv2.approxPolyDP(c, 0.02 * peri, True)
-                if len(approx) == 4:
-                    doc_cnt = approx
-                    break
-
-            if doc_cnt is None:
-                raise ValueError("无法找到答题卡区域")
-
-            warped = four_point_transform(cv2.cvtColor(current_image, cv2.COLOR_BGR2GRAY), doc_cnt.reshape(4, 2))
+            warped = warp_sheet(current_image)
             show_preview(warped, "透视变换后的答题卡")
 
             # 检测答案
@@ -181,17 +373,45 @@ def main_ui():
     img_frame = tk.Frame(root, width=600, height=600, bg="gray")
     img_frame.pack(side=tk.TOP, padx=10, pady=10, fill=tk.BOTH, expand=True)
 
-    global img_label, img_label_title, result_label
+    global img_label, img_label_title, preview, result_label
     img_label = tk.Label(img_frame)
     img_label.pack(fill=tk.BOTH, expand=True)
 
     img_label_title = tk.Label(root, text="", font=("Arial", 14))
     img_label_title.pack(side=tk.BOTTOM, pady=5)
+    preview = ImagePreview(img_label, (600, 400), img_label_title)
 
     result_label = tk.Label(root, text="", font=("Arial", 14))
     result_label.pack(side=tk.BOTTOM, pady=5)
 
     root.mainloop()
 
-# 启动 Tkinter UI
-main_ui()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="答题卡识别工具，不带参数时启动图形界面")
+    parser.add_argument("--batch", metavar="SOURCE", help="批量识别的目录或通配符，如 examples/answerCard/test_*.png")
+    parser.add_argument("-o", "--output", default="answers.csv", help="结果文件，扩展名为 .jsonl 时按 JSONL 输出，.json 时输出 JSON 数组，其余为 CSV")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="工作进程数，默认使用全部 CPU 核心")
+    parser.add_argument("--layout", help="版式文件（JSON）；与 --register 一起使用时为输出路径")
+    parser.add_argument("--register", metavar="IMAGE", help="从参考答题卡登记版式并保存到 --layout")
+    parser.add_argument("--options", type=int, default=5, help="登记版式时每题的选项数")
+    parser.add_argument("--benchmark", action="store_true", help="在合成的密集答题卡上对比气泡计分耗时")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.benchmark:
+        benchmark_scoring()
+    elif args.register:
+        img = cv2.imread(args.register, cv2.IMREAD_COLOR)
+        if img is None:
+            sys.exit(f"无法读取图片：{args.register}")
+        layout = AnswerLayout.register(img, args.options)
+        layout.save(args.layout or "layout.json")
+        print(f"已登记版式：{layout.rows} 题 × {layout.options} 选项", file=sys.stderr)
+    elif args.batch:
+        batch_grade(args.batch, args.output, args.workers, args.layout)
+    else:
+        # 启动 Tkinter UI
+        main_ui()
@@ -1,47 +1,56 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinter import ttk
-from PIL import Image, ImageTk
 import cv2
 import numpy as np
 
+from operations import Param, register, run_operation, size
+
 # 腐蚀操作
-def apply_erosion(image, kernel_size=(3, 3), iterations=1):
+@register("erode", Param("kernel_size", size, (3, 3)), Param("iterations", int, 1), label="腐蚀")
+def apply_erosion(image, kernel_size=(3, 3), iterations=1, dst=None):
     kernel = np.ones(kernel_size, np.uint8)
-    return cv2.erode(image, kernel, iterations=iterations)
+    return cv2.erode(image, kernel, dst=dst, iterations=iterations)
 
 # 膨胀操作
-def apply_dilation(image, kernel_size=(3, 3), iterations=1):
+@register("dilate", Param("kernel_size", size, (3, 3)), Param("iterations", int, 1), label="膨胀")
+def apply_dilation(image, kernel_size=(3, 3), iterations=1, dst=None):
     kernel = np.ones(kernel_size, np.uint8)
-    return cv2.dilate(image, kernel, iterations=iterations)
+    return cv2.dilate(image, kernel, dst=dst, iterations=iterations)
 
 # 开运算（先腐蚀后膨胀）
-def apply_opening(image, kernel_size=(5, 5)):
+@register("opening", Param("kernel_size", size, (5, 5)), label="开运算")
+def apply_opening(image, kernel_size=(5, 5), dst=None):
     kernel = np.ones(kernel_size, np.uint8)
-    return cv2.morphologyEx(image, cv2.MORPH_OPEN, kernel)
+    return cv2.morphologyEx(image, cv2.MORPH_OPEN, kernel, dst=dst)
 
 # 闭运算（先膨胀后腐蚀）
-def apply_closing(image, kernel_size=(5, 5)):
+@register("closing", Param("kernel_size", size, (5, 5)), label="闭运算")
+def apply_closing(image, kernel_size=(5, 5), dst=None):
     kernel = np.ones(kernel_size, np.uint8)
-    return cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernel)
+    return cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernel, dst=dst)
 
 # 梯度操作（膨胀 - 腐蚀）
-def apply_gradient(image, kernel_size=(5, 5)):
+@register("gradient", Param("kernel_size", size, (5, 5)), label="梯度")
+def apply_gradient(image, kernel_size=(5, 5), dst=None):
     kernel = np.ones(kernel_size, np.uint8)
-    return cv2.morphologyEx(image, cv2.MORPH_GRADIENT, kernel)
+    return cv2.morphologyEx(image, cv2.MORPH_GRADIENT, kernel, dst=dst)
 
 # 礼帽操作（原图 - 开运算）
-def apply_tophat(image, kernel_size=(5, 5)):
+@register("tophat", Param("kernel_size", size, (5, 5)), label="礼帽")
+def apply_tophat(image, kernel_size=(5, 5), dst=None):
     kernel = np.ones(kernel_size, np.uint8)
-    return cv2.morphologyEx(image, cv2.MORPH_TOPHAT, kernel)
+    return cv2.morphologyEx(image, cv2.MORPH_TOPHAT, kernel, dst=dst)
 
 # 黑帽操作（闭运算 - 原图）
-def apply_blackhat(image, kernel_size=(5, 5)):
+@register("blackhat", Param("kernel_size", size, (5, 5)), label="黑帽")
+def apply_blackhat(image, kernel_size=(5, 5), dst=None):
     kernel = np.ones(kernel_size, np.uint8)
-    return cv2.morphologyEx(image, cv2.MORPH_BLACKHAT, kernel)
+    return cv2.morphologyEx(image, cv2.MORPH_BLACKHAT, kernel, dst=dst)
 
 # Tkinter 主界面
 def main_ui():
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    from preview import ImagePreview
+
     global current_image, current_image_path
     current_image = None
     current_image_path = None
@@ -74,54 +83,21 @@ def main_ui():
             cv2.imwrite(file_path, current_image)
             messagebox.showinfo("成功", "图片已保存")
 
-    def apply_morphology(operation, kernel_size=(5, 5), iterations=1):
-        """应用形态学操作"""
+    def apply_morphology(operation, **params):
+        """应用形态学操作，params 为核大小等参数，未给出时取注册的默认值"""
         global current_image
         if current_image is None:
             messagebox.showwarning("警告", "请先加载图片")
             return
         try:
-            if operation == "腐蚀":
-                result = apply_erosion(current_image, kernel_size, iterations)
-            elif operation == "膨胀":
-                result = apply_dilation(current_image, kernel_size, iterations)
-            elif operation == "开运算":
-                result = apply_opening(current_image, kernel_size)
-            elif operation == "闭运算":
-                result = apply_closing(current_image, kernel_size)
-            elif operation == "梯度":
-                result = apply_gradient(current_image, kernel_size)
-            elif operation == "礼帽":
-                result = apply_tophat(current_image, kernel_size)
-            elif operation == "黑帽":
-                result = apply_blackhat(current_image, kernel_size)
-            else:
-                raise ValueError("未知形态学操作")
+            result = run_operation(operation, current_image, **params)  # 按界面名称执行对应的形态学操作
             show_preview(result, f"{operation} 操作结果")
         except Exception as e:
             messagebox.showerror("错误", str(e))
 
     def show_preview(image, title=""):
         """显示图片预览"""
-        max_width, max_height = 800, 800  # 限制图片显示的最大宽度和高度
-        height, width = image.shape[:2]
-
-        # 计算缩放比例
-        scale = min(max_width / width, max_height / height, 1.0)
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-
-        # 调整图片大小以适配显示区域
-        resized_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-
-        # 转换为RGB模式并显示在Tkinter中
-        image_rgb = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB) if len(resized_image.shape) == 3 else resized_image
-        pil_image = Image.fromarray(image_rgb)
-        tk_image = ImageTk.PhotoImage(pil_image)
-
-        img_label.config(image=tk_image)
-        img_label.image = tk_image
-        img_label_title.config(text=title)
+        preview.show(image, title)
 
     # 主窗口布局调整
     root = tk.Tk()
@@ -138,8 +114,8 @@ def main_ui():
     ttk.Button(button_frame, text="保存图片", command=save_image_ui).pack(side=tk.LEFT, padx=5)
 
     # 添加形态学操作按钮
-    ttk.Button(button_frame, text="腐蚀", command=lambda: apply_morphology("腐蚀", (3, 3), 1)).pack(side=tk.LEFT, padx=5)
-    ttk.Button(button_frame, text="膨胀", command=lambda: apply_morphology("膨胀", (3, 3), 1)).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="腐蚀", command=lambda: apply_morphology("腐蚀", kernel_size=(3, 3), iterations=1)).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="膨胀", command=lambda: apply_morphology("膨胀", kernel_size=(3, 3), iterations=1)).pack(side=tk.LEFT, padx=5)
     ttk.Button(button_frame, text="开运算", command=lambda: apply_morphology("开运算")).pack(side=tk.LEFT, padx=5)
     ttk.Button(button_frame, text="闭运算", command=lambda: apply_morphology("闭运算")).pack(side=tk.LEFT, padx=5)
     ttk.Button(button_frame, text="梯度", command=lambda: apply_morphology("梯度")).pack(side=tk.LEFT, padx=5)
@@ -155,8 +131,10 @@ def main_ui():
 
     img_label_title = tk.Label(root, text="", font=("Arial", 14))
     img_label_title.pack(side=tk.BOTTOM, pady=5)
+    preview = ImagePreview(img_label, (800, 800), img_label_title)
 
     root.mainloop()
 
 # 启动UI
-main_ui()
+if __name__ == "__main__":
+    main_ui()
@@ -1,9 +1,16 @@
+import argparse
+import glob
+import os
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinter import ttk
-from PIL import Image, ImageTk
+
+from image_cache import derived_cache
+from operations import register, run_operation
 
 # 模板匹配方法映射
 MATCH_METHODS = {
@@ -16,18 +23,23 @@ MATCH_METHODS = {
 }
 
 # 图像金字塔操作函数
+@register("pyr_up", label="PyrUp")
+def pyr_up(img, dst=None):
+    return cv2.pyrUp(img, dst=dst)  # 执行金字塔上采样
+
+@register("pyr_down", label="PyrDown")
+def pyr_down(img, dst=None):
+    return cv2.pyrDown(img, dst=dst)  # 执行金字塔下采样
+
 def pyramid_operations(img, operation):
     # 根据选择的操作类型执行金字塔上采样或下采样
-    if operation == "PyrUp":
-        return cv2.pyrUp(img)  # 执行金字塔上采样
-    elif operation == "PyrDown":
-        return cv2.pyrDown(img)  # 执行金字塔下采样
-    else:
+    if operation not in ("PyrUp", "PyrDown"):
         raise ValueError("未知金字塔操作")  # 抛出未知操作异常
+    return run_operation(operation, img)
 
 # 轮廓检测函数
 def find_contours(img):
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)  # 将图像转换为灰度图
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img  # 将图像转换为灰度图
     _, thresh = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)  # 应用二值化阈值处理
     contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)  # 查找图像轮廓
     return contours, hierarchy, thresh  # 返回轮廓和层次结构
@@ -37,26 +49,339 @@ def draw_contours(img, contours, index=-1):
     # 在图像上绘制轮廓，默认为绘制所有轮廓
     return cv2.drawContours(img.copy(), contours, index, (0, 0, 255), 2)  # 用红色绘制轮廓
 
+# 检测并绘制全部轮廓
+@register("contours", label="Contours")
+def contours_overlay(img):
+    contours, _, _ = find_contours(img)
+    return draw_contours(img if img.ndim == 3 else cv2.cvtColor(img, cv2.COLOR_GRAY2BGR), contours)
+
 # 模板匹配函数
-def template_matching(img, template, method=cv2.TM_CCOEFF_NORMED):
-    # 使用指定的方法执行模板匹配
+def template_matching(img, template, method=cv2.TM_CCOEFF_NORMED, levels=0, threshold=None):
+    # levels 为 0 时在原分辨率上穷举匹配；大于 0 时先在金字塔第 levels 层粗匹配，再只在候选窗口内精匹配
+    if levels > 0:
+        return pyramid_template_matching(img, template, method, levels, threshold)
     return cv2.matchTemplate(img, template, method)  # 返回匹配结果
 
+
+# 金字塔粗到精模板匹配
+def pyramid_template_matching(img, template, method=cv2.TM_CCOEFF_NORMED, levels=2, threshold=None,
+                              max_candidates=5, margin=0.1):
+    """在金字塔顶层找到候选位置后回到原分辨率，仅在候选附近的小窗口内重新匹配。
+
+    返回与 cv2.matchTemplate 同尺寸的结果图，未搜索的位置填充为已搜索结果中最差的得分，
+    因此 minMaxLoc 和阈值筛选的用法与穷举匹配一致。精匹配的候选为：得分最高的 max_candidates 个峰值、
+    顶层得分与最高峰相差不超过 margin 的所有峰值（非归一化方法按得分范围折算），以及 threshold
+    不为空时所有可能达到阈值的位置。
+
+    精度取舍：只有真正的最佳位置在顶层的得分落在最高峰 margin 以内时，结果才与穷举匹配一致。
+    场景中有多个相似实例时顶层得分的排序会被打乱，margin 越大越稳妥，但要精匹配的窗口也越多。
+    """
+    th, tw = template.shape[:2]
+    # 模板在顶层过小会失去区分度，限制层数
+    while levels > 0 and min(th, tw) >> levels < 8:
+        levels -= 1
+    if levels == 0:
+        return cv2.matchTemplate(img, template, method)
+
+    # 图像和模板的金字塔按数组缓存，同一场景匹配多个模板或反复匹配时不再重复下采样
+    small_img = derived_cache.pyramid(img, levels)[-1]
+    small_template = derived_cache.pyramid(template, levels)[-1]
+    coarse = cv2.matchTemplate(small_img, small_template, method)
+
+    # 统一为“越大越好”，再取局部极大值作为候选
+    lower_is_better = method in (cv2.TM_SQDIFF, cv2.TM_SQDIFF_NORMED)
+    score = -coarse if lower_is_better else coarse
+    peaks = score >= cv2.dilate(score, np.ones((3, 3), np.uint8))
+    ys, xs = np.nonzero(peaks)
+    peak_scores = score[ys, xs]
+    top = np.argsort(peak_scores)[::-1][:max_candidates]
+    candidates = np.zeros(score.shape, np.uint8)
+    candidates[ys[top], xs[top]] = 255
+    # 与最高峰接近的峰值都要精匹配，归一化方法的得分范围为 1，其余方法按顶层得分的实际范围折算
+    normed = method in (cv2.TM_SQDIFF_NORMED, cv2.TM_CCORR_NORMED, cv2.TM_CCOEFF_NORMED)
+    best = peak_scores.max()
+    near = peak_scores >= best - margin * (1.0 if normed else best - score.min())
+    candidates[ys[near], xs[near]] = 255
+    if threshold is not None and not lower_is_better:
+        # 低分辨率下得分会偏低，放宽阈值以免漏检
+        candidates[score >= threshold - 0.2] = 255
+    candidates = cv2.dilate(candidates, np.ones((3, 3), np.uint8))  # 向外扩展一个顶层像素作为精匹配余量
+
+    # 每个候选连通区域对应原分辨率上的一个搜索窗口
+    rows, cols = img.shape[0] - th + 1, img.shape[1] - tw + 1
+    result = np.full((rows, cols), np.nan, dtype=np.float32)
+    scale = 1 << levels
+    count, _, stats, _ = cv2.connectedComponentsWithStats(candidates)
+    for x, y, w, h, _ in stats[1:count]:
+        x0, y0 = x * scale, y * scale
+        x1, y1 = min((x + w) * scale, cols) - 1, min((y + h) * scale, rows) - 1
+        window = img[y0:y1 + th, x0:x1 + tw]
+        result[y0:y1 + 1, x0:x1 + 1] = cv2.matchTemplate(window, template, method)
+
+    searched = ~np.isnan(result)
+    worst = np.nanmax(result) if lower_is_better else np.nanmin(result)
+    result[~searched] = worst
+    return result
+
+
+# 非极大值抑制
+def non_max_suppression(boxes, scores, overlap=0.3):
+    """按得分从高到低保留框，去掉与已保留框 IoU 超过 overlap 的框，返回保留的下标"""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(scores)[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter)
+        order = rest[iou <= overlap]
+    return np.array(keep, dtype=np.intp)
+
+
 # 多模板匹配函数
-def multi_template_matching(img, template, threshold=0.8):
+def multi_template_matching(img, template, threshold=0.8, levels=0, overlap=0.3):
+    """返回每个匹配实例一个框：boxes 为 (N, 4) 的 [x1, y1, x2, y2]，scores 为 (N,) 的匹配得分，按得分降序"""
     # 获取模板的高度和宽度
     h, w = template.shape[:2]
-    gray_image = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)  # 将图像转换为灰度图
-    res = cv2.matchTemplate(gray_image, template, cv2.TM_CCOEFF_NORMED)  # 执行模板匹配
-    loc = np.where(res >= threshold)  # 查找符合阈值的坐标
-    matches = []  # 存储匹配结果
-    for pt in zip(*loc[::-1]):
-        # 保存每个匹配的左上角和右下角的坐标
-        matches.append((pt, (pt[0] + w, pt[1] + h)))
-    return matches  # 返回所有匹配的区域
+    gray_image = derived_cache.gray(img)  # 取（按图像缓存的）灰度图
+    res = template_matching(gray_image, template, cv2.TM_CCOEFF_NORMED, levels, threshold)  # 执行模板匹配
+    return extract_matches(res, w, h, threshold, overlap)
+
+
+# 从匹配结果图中提取匹配框
+def extract_matches(res, w, h, threshold=0.8, overlap=0.3):
+    """只保留达到阈值的局部极大值（邻域取模板一半大小），再做非极大值抑制"""
+    kernel = np.ones((max(h // 2, 1) | 1, max(w // 2, 1) | 1), np.uint8)
+    peaks = (res >= threshold) & (res >= cv2.dilate(res, kernel))
+    ys, xs = np.nonzero(peaks)
+    scores = res[ys, xs]
+    boxes = np.stack([xs, ys, xs + w, ys + h], axis=1).astype(np.int32)
+    keep = non_max_suppression(boxes, scores, overlap)
+    return boxes[keep], scores[keep]
+
+
+# 基于 FFT 的模板匹配，窗口统计量用双精度积分图计算
+class FFTMatcher:
+    """用频域互相关计算与 TM_CCOEFF_NORMED 相同的归一化相关系数，供需要更高精度时选用。
+
+    窗口均值和方差来自双精度积分图，在近乎平坦的窗口上比 matchTemplate 的单精度累加准确得多。
+    速度并不比 matchTemplate 快：每次查询仍要把模板补到整幅场景的尺寸做正向 DFT、频谱相乘和逆 DFT，
+    缓存只省下场景一侧的正向 DFT 和积分图，而 matchTemplate 内部本身就是分块 DFT。
+    场景数据按图像对象缓存（最多 max_scenes 张，LRU 淘汰），原地修改已缓存的图像后需调用 forget()。
+    """
+
+    def __init__(self, max_scenes=4):
+        self.max_scenes = max_scenes
+        self._scenes = OrderedDict()  # id(img) -> (弱引用, 场景数据)
+
+    def forget(self, img=None):
+        if img is None:
+            self._scenes.clear()
+        else:
+            self._scenes.pop(id(img), None)
+
+    def prepare(self, img):
+        """计算（或取出缓存的）场景数据"""
+        key = id(img)
+        cached = self._scenes.get(key)
+        if cached is not None and cached[0]() is img:
+            self._scenes.move_to_end(key)
+            return cached[1]
+
+        gray = derived_cache.gray(img)
+        rows, cols = gray.shape
+        # 只需“有效”区域的互相关，补零到不小于原图的最优尺寸即可避免循环卷积的回绕
+        dft_size = (cv2.getOptimalDFTSize(rows), cv2.getOptimalDFTSize(cols))
+        padded = np.zeros(dft_size, np.float32)
+        padded[:rows, :cols] = gray
+        sums, sqsums = cv2.integral2(gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        scene = {"shape": (rows, cols), "dft_size": dft_size, "spectrum": cv2.dft(padded, nonzeroRows=rows),
+                 "sum": sums, "sqsum": sqsums, "norms": {}}
+
+        self._scenes[key] = (weakref.ref(img, lambda _, k=key: self._scenes.pop(k, None)), scene)
+        while len(self._scenes) > self.max_scenes:
+            self._scenes.popitem(last=False)
+        return scene
+
+    @staticmethod
+    def _inverse_window_norm(scene, h, w):
+        """每个窗口内图像去均值后的 L2 范数的倒数（平坦窗口为 0），按模板尺寸缓存"""
+        norm = scene["norms"].get((h, w))
+        if norm is None:
+            s, q = scene["sum"], scene["sqsum"]
+            window_sum = s[h:, w:] - s[:-h, w:] - s[h:, :-w] + s[:-h, :-w]
+            window_sq = q[h:, w:] - q[:-h, w:] - q[h:, :-w] + q[:-h, :-w]
+            var = window_sq - window_sum * window_sum / (h * w)
+            norm = np.zeros(var.shape, np.float32)
+            np.divide(1.0, np.sqrt(var), out=norm, where=var > 1e-3, casting="unsafe")
+            scene["norms"][(h, w)] = norm
+        return norm
+
+    def match(self, img, template, mean=None, std=None):
+        """返回与 cv2.matchTemplate(gray, template, TM_CCOEFF_NORMED) 同尺寸的结果图"""
+        scene = self.prepare(img)
+        rows, cols = scene["shape"]
+        h, w = template.shape[:2]
+        if mean is None or std is None:
+            mean, std = (v[0, 0] for v in cv2.meanStdDev(template))
+        template_norm = std * np.sqrt(h * w)
+        if template_norm == 0:
+            return np.zeros((rows - h + 1, cols - w + 1), np.float32)
+
+        padded = np.zeros(scene["dft_size"], np.float32)
+        padded[:h, :w] = template
+        padded[:h, :w] -= mean
+        product = cv2.mulSpectrums(scene["spectrum"], cv2.dft(padded, nonzeroRows=h), 0, conjB=True)
+        corr = cv2.idft(product, flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)[:rows - h + 1, :cols - w + 1]
+        return corr * self._inverse_window_norm(scene, h, w) * np.float32(1.0 / template_norm)
+
+
+# 比较 FFT 匹配与 template_matching 在不同模板尺寸下的耗时和结果差异
+def benchmark_fft_matching(image_path="examples/cat.jpg", sizes=(16, 32, 64, 128, 256), queries=3):
+    img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("无法读取图片")
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    rows, cols = gray.shape
+    matcher = FFTMatcher()
+
+    start = time.perf_counter()
+    matcher.prepare(img)
+    print(f"{image_path} {cols}x{rows}，场景频谱与积分图: {(time.perf_counter() - start) * 1000:.1f} ms（只计算一次）")
+    for size in sizes:
+        y, x = rows // 3, cols // 3
+        templates = [gray[y + i * 7:y + i * 7 + size, x + i * 5:x + i * 5 + size] for i in range(queries)]
+
+        start = time.perf_counter()
+        expected = [template_matching(gray, t) for t in templates]
+        direct = (time.perf_counter() - start) / queries
+        start = time.perf_counter()
+        results = [matcher.match(img, t) for t in templates]
+        fft = (time.perf_counter() - start) / queries
+
+        # 差异集中在近乎平坦的窗口，matchTemplate 在这些位置的单精度累加本身误差较大
+        differ = np.mean([float((np.abs(r - e) > 1e-3).mean()) for r, e in zip(results, expected)])
+        same = all(cv2.minMaxLoc(r)[3] == cv2.minMaxLoc(e)[3] for r, e in zip(results, expected))
+        print(f"  模板 {size}x{size}: matchTemplate {direct * 1000:.1f} ms，FFT {fft * 1000:.1f} ms"
+              f"（耗时为 matchTemplate 的 {fft / direct:.2f} 倍），差异超过 1e-3 的位置 {differ:.4%}，"
+              f"最佳位置{'一致' if same else '不一致'}")
+
+
+# 模板库：一次加载、缩放并缓存所有模板
+class TemplateBank:
+    """多模板、多尺度匹配。
+
+    模板在加入时解码为灰度图并按 scales 生成各尺度版本，同时缓存均值和标准差；
+    之后每次查询只对输入图像做一次灰度转换，再用线程池并行匹配所有 (模板, 尺度) 组合。
+    """
+
+    def __init__(self, scales=(1.0,), workers=None, matcher=None):
+        self.scales = tuple(scales)
+        self.workers = workers or os.cpu_count() or 1
+        self.matcher = matcher  # 传入 FFTMatcher 时改用频域匹配：平坦区域的得分更准确，但不会更快
+        self.entries = []  # 每项为 {"name", "scale", "image", "mean", "std"}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, name, template):
+        """加入一个模板（BGR 或灰度数组）并生成各尺度版本"""
+        if template.ndim == 3:
+            template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+        for scale in self.scales:
+            if scale == 1.0:
+                scaled = template
+            else:
+                interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+                scaled = cv2.resize(template, None, fx=scale, fy=scale, interpolation=interpolation)
+            if min(scaled.shape[:2]) < 4:
+                continue
+            mean, std = cv2.meanStdDev(scaled)
+            if std[0, 0] == 0:  # 纯色模板无法计算归一化相关系数
+                continue
+            self.entries.append({"name": name, "scale": scale, "image": np.ascontiguousarray(scaled),
+                                 "mean": float(mean[0, 0]), "std": float(std[0, 0])})
+
+    def load(self, source):
+        """从目录或通配符批量加载模板，模板名为文件名"""
+        if os.path.isdir(source):
+            paths = [os.path.join(source, name) for name in os.listdir(source)
+                     if name.lower().endswith((".jpg", ".png", ".bmp"))]
+        else:
+            paths = glob.glob(source)
+        for path in sorted(paths):
+            img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                raise ValueError(f"无法读取模板：{path}")
+            self.add(os.path.basename(path), img)
+        return self
+
+    def match(self, img, threshold=0.8, overlap=0.3, top_k=None):
+        """在图像中匹配库中所有模板，返回按得分降序排列的检测结果列表"""
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        if self.matcher is not None:
+            self.matcher.prepare(img)  # 在进入线程池之前建好场景数据，避免各线程重复计算
+
+        def run(entry):
+            template = entry["image"]
+            h, w = template.shape[:2]
+            if h > gray.shape[0] or w > gray.shape[1]:
+                return []
+            if self.matcher is not None:
+                res = self.matcher.match(img, template, entry["mean"], entry["std"])
+            else:
+                res = cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
+            boxes, scores = extract_matches(res, w, h, threshold, overlap)
+            return [{"name": entry["name"], "scale": entry["scale"], "box": box, "score": score}
+                    for box, score in zip(boxes.tolist(), scores.tolist())]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            detections = [d for found in pool.map(run, self.entries) for d in found]
+        detections.sort(key=lambda d: d["score"], reverse=True)
+        return detections[:top_k] if top_k else detections
+
+
+# 比较穷举匹配与金字塔匹配的耗时
+def benchmark_pyramid_matching(image_path="examples/image.png", template_path="examples/template.png",
+                               levels=(1, 2, 3), repeat=5, method=cv2.TM_CCOEFF_NORMED):
+    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+    if img is None or template is None:
+        raise ValueError("无法读取图片或模板")
+
+    def timed(n):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            derived_cache.invalidate()  # 不使用缓存的金字塔，只比较匹配算法本身
+            res = template_matching(img, template, method, n)
+        return (time.perf_counter() - start) / repeat, res
+
+    base_time, base = timed(0)
+    _, base_val, _, base_loc = cv2.minMaxLoc(base)
+    print(f"{image_path} {img.shape[1]}x{img.shape[0]}，模板 {template.shape[1]}x{template.shape[0]}")
+    print(f"  穷举匹配: {base_time * 1000:.1f} ms，最佳位置 {base_loc}，得分 {base_val:.4f}")
+    for n in levels:
+        t, res = timed(n)
+        _, val, _, loc = cv2.minMaxLoc(res)
+        print(f"  金字塔 {n} 层: {t * 1000:.1f} ms，加速 {base_time / t:.1f} 倍，最佳位置 {loc}，得分 {val:.4f}，"
+              f"{'与穷举一致' if loc == base_loc else '与穷举不一致（顶层候选未覆盖最佳位置）'}")
+
+    # 多模板匹配：阈值以上的像素数与非极大值抑制后的框数
+    boxes, _ = multi_template_matching(cv2.cvtColor(img, cv2.COLOR_GRAY2BGR), template, 0.8)
+    print(f"  多模板匹配（阈值 0.8）: {int((base >= 0.8).sum())} 个候选像素 -> {len(boxes)} 个框")
+
 
 # Tkinter 主界面函数
 def main_ui():
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    from preview import ImagePreview
+
     # 全局变量定义
     global current_image, current_image_path, template_image, selected_method
     current_image = None
@@ -121,19 +446,14 @@ def main_ui():
             messagebox.showwarning("警告", "请先加载模板")
             return
         try:
-            if operation in ["PyrUp", "PyrDown"]:  # 如果操作是金字塔上采样或下采样
-                result = pyramid_operations(current_image, operation)
-                show_preview(result, f"{operation} 操作结果")  # 显示操作结果
-            elif operation == "Contours":  # 如果操作是轮廓检测
-                contours, hierarchy, thresh = find_contours(current_image)
-                result = draw_contours(current_image, contours)  # 绘制轮廓
-                show_preview(result, f"{operation} 操作结果")  # 显示操作结果
-            elif operation == "Multi Template Matching":  # 如果操作是多模板匹配
+            if operation == "Multi Template Matching":  # 如果操作是多模板匹配
                 threshold = threshold_var.get()  # 获取阈值
-                matches = multi_template_matching(current_image, template_image, threshold)  # 进行多模板匹配
-                show_multi_template_matching_on_main_page(matches)  # 在主页面显示匹配结果
-            else:
-                raise ValueError("未知操作")  # 抛出未知操作异常
+                boxes, scores = multi_template_matching(current_image, template_image, threshold,
+                                                        levels_var.get())  # 进行多模板匹配
+                show_multi_template_matching_on_main_page(boxes, scores)  # 在主页面显示匹配结果
+            else:  # PyrUp、PyrDown、Contours 等注册的操作
+                result = run_operation(operation, current_image)
+                show_preview(result, f"{operation} 操作结果")  # 显示操作结果
         except Exception as e:
             messagebox.showerror("错误", str(e))  # 弹出错误信息
 
@@ -148,9 +468,10 @@ def main_ui():
             messagebox.showwarning("警告", "请先加载模板")
             return
         try:
-            gray_image = cv2.cvtColor(current_image, cv2.COLOR_BGR2GRAY)  # 将当前图像转换为灰度图像
+            gray_image = derived_cache.gray(current_image)  # 取当前图像（按图像缓存的）灰度图
             method = MATCH_METHODS[selected_method]  # 获取选择的模板匹配方法
-            match_result = template_matching(gray_image, template_image, method)  # 进行模板匹配
+            levels = levels_var.get()  # 获取金字塔层数（0 为穷举匹配）
+            match_result = template_matching(gray_image, template_image, method, levels)  # 进行模板匹配
             show_template_matching_on_main_page(match_result, method)  # 显示匹配结果
         except Exception as e:
             messagebox.showerror("错误", str(e))  # 弹出错误信息
@@ -176,38 +497,22 @@ def main_ui():
         show_preview(result_image, f"模板匹配结果 ({selected_method})")  # 显示带有匹配矩形的图像
 
     # 在主页面显示多模板匹配结果的函数
-    def show_multi_template_matching_on_main_page(matches):
+    def show_multi_template_matching_on_main_page(boxes, scores):
         """在主页面显示多模板匹配结果"""
         global current_image, template_image
 
         result_image = current_image.copy()  # 复制当前图像
-        for top_left, bottom_right in matches:
-            cv2.rectangle(result_image, top_left, bottom_right, (0, 255, 0), 2)  # 在每个匹配区域绘制矩形框
+        for (x1, y1, x2, y2), score in zip(boxes.tolist(), scores.tolist()):
+            cv2.rectangle(result_image, (x1, y1), (x2, y2), (0, 255, 0), 2)  # 在每个匹配区域绘制矩形框
+            cv2.putText(result_image, f"{score:.2f}", (x1, max(y1 - 5, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.4,
+                        (0, 255, 0), 1)  # 标注匹配得分
 
-        show_preview(result_image, "多模板匹配结果")  # 显示匹配结果图像
+        show_preview(result_image, f"多模板匹配结果（{len(boxes)} 个）")  # 显示匹配结果图像
 
     # 显示图像预览函数
     def show_preview(image, title=""):
         """显示图片预览"""
-        max_width, max_height = 400, 400  # 限制图片显示的最大宽度和高度
-        height, width = image.shape[:2]  # 获取图像的高度和宽度
-
-        # 计算缩放比例
-        scale = min(max_width / width, max_height / height, 1.0)
-        new_width = int(width * scale)  # 计算新宽度
-        new_height = int(height * scale)  # 计算新高度
-
-        # 调整图片大小以适配显示区域
-        resized_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-
-        # 转换为RGB模式并显示在Tkinter中
-        image_rgb = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB) if len(resized_image.shape) == 3 else resized_image
-        pil_image = Image.fromarray(image_rgb)  # 将OpenCV图像转换为PIL图像
-        tk_image = ImageTk.PhotoImage(pil_image)  # 将PIL图像转换为Tkinter可用格式
-
-        img_label.config(image=tk_image)  # 更新标签显示
-        img_label.image = tk_image  # 保持对图像的引用，防止被垃圾回收
-        img_label_title.config(text=title)  # 更新图像标题
+        preview.show(image, title)
 
     # 主窗口布局设置
     root = tk.Tk()
@@ -244,6 +549,11 @@ def main_ui():
 
     method_combobox.bind("<<ComboboxSelected>>", update_method)  # 当下拉框更改时更新方法
 
+    # 金字塔层数输入框（0 为原分辨率穷举匹配）
+    ttk.Label(button_frame, text="金字塔层数:").pack(side=tk.LEFT, padx=5)
+    levels_var = tk.IntVar(value=0)
+    ttk.Spinbox(button_frame, from_=0, to=4, textvariable=levels_var, width=3).pack(side=tk.LEFT, padx=5)
+
     ttk.Button(button_frame, text="模板匹配", command=apply_template_matching).pack(side=tk.LEFT, padx=5)  # 模板匹配按钮
 
     # 阈值输入框
@@ -266,9 +576,36 @@ def main_ui():
 
     img_label_title = tk.Label(root, text="", font=("Arial", 14))  # 创建标题标签
     img_label_title.pack(side=tk.BOTTOM, pady=5)  # 显示在底部
+    preview = ImagePreview(img_label, (400, 400), img_label_title)
 
     root.mainloop()  # 启动主循环
 
 
-# 启动UI
-main_ui()  # 调用主UI函数来启动应用程序
+def parse_args():
+    parser = argparse.ArgumentParser(description="图像操作工具，不带参数时启动图形界面")
+    parser.add_argument("--benchmark", action="store_true", help="在 examples/ 上比较穷举匹配与金字塔匹配的耗时")
+    parser.add_argument("--image", default="examples/image.png", help="基准测试使用的图像")
+    parser.add_argument("--template", default="examples/template.png", help="基准测试使用的模板")
+    parser.add_argument("--fft", action="store_true", help="基准测试改为比较 FFT 匹配；模板库改用精度更高（但不更快）的 FFT 匹配")
+    parser.add_argument("--bank", metavar="SOURCE", help="模板库目录或通配符，在 --image 上匹配所有模板")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0], help="模板库的缩放尺度")
+    parser.add_argument("--threshold", type=float, default=0.8, help="模板库匹配阈值")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.benchmark and args.fft:
+        benchmark_fft_matching()
+    elif args.benchmark:
+        benchmark_pyramid_matching(args.image, args.template)
+    elif args.bank:
+        bank = TemplateBank(args.scales, matcher=FFTMatcher() if args.fft else None).load(args.bank)
+        image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+        if image is None:
+            raise SystemExit(f"无法读取图片：{args.image}")
+        for d in bank.match(image, args.threshold):
+            print(f"{d['name']}\t{d['scale']:g}\t{d['score']:.4f}\t{d['box']}")
+    else:
+        # 启动UI
+        main_ui()  # 调用主UI函数来启动应用程序
@@ -1,44 +1,61 @@
 import cv2
 import numpy as np
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinter import ttk
-from PIL import Image, ImageTk
+
+from image_cache import derived_cache
+from operations import Param, boolean, register, run_operation, size
+
+# 阈值方法名到 OpenCV 常量的映射
+THRESHOLD_TYPES = {
+    "BINARY": cv2.THRESH_BINARY,
+    "BINARY_INV": cv2.THRESH_BINARY_INV,
+    "TRUNC": cv2.THRESH_TRUNC,
+    "TOZERO": cv2.THRESH_TOZERO,
+    "TOZERO_INV": cv2.THRESH_TOZERO_INV,
+}
+FILTERS = ("均值滤波", "方框滤波", "高斯滤波", "中值滤波")  # 界面上可选的滤波方法
 
 # 图像处理函数
+@register("threshold", Param("method", str, "BINARY", tuple(THRESHOLD_TYPES)), Param("thresh", float, 127),
+          Param("maxval", float, 255), input="gray", label="阈值处理")
+def threshold(img_gray, method="BINARY", thresh=127, maxval=255, dst=None):
+    """固定阈值处理"""
+    _, result = cv2.threshold(img_gray, thresh, maxval, THRESHOLD_TYPES[method], dst=dst)
+    return result
+
+@register("blur", Param("ksize", size, (3, 3)), label="均值滤波")
+def mean_blur(img, ksize=(3, 3), dst=None):
+    return cv2.blur(img, ksize, dst=dst)
+
+@register("box_filter", Param("ksize", size, (3, 3)), Param("normalize", boolean, False), label="方框滤波")
+def box_filter(img, ksize=(3, 3), normalize=False, dst=None):
+    return cv2.boxFilter(img, -1, ksize, dst=dst, normalize=normalize)
+
+@register("gaussian_blur", Param("ksize", size, (5, 5)), Param("sigma", float, 1), label="高斯滤波")
+def gaussian_blur(img, ksize=(5, 5), sigma=1, dst=None):
+    return cv2.GaussianBlur(img, ksize, sigma, dst=dst)
+
+@register("median_blur", Param("ksize", int, 5), label="中值滤波")
+def median_blur(img, ksize=5, dst=None):
+    return cv2.medianBlur(img, ksize, dst=dst)
+
 def apply_threshold(img_gray, method):
     """应用阈值操作"""
-    # 根据选择的阈值方法，对灰度图像进行处理
-    if method == "BINARY":
-        _, thresh = cv2.threshold(img_gray, 127, 255, cv2.THRESH_BINARY)
-    elif method == "BINARY_INV":
-        _, thresh = cv2.threshold(img_gray, 127, 255, cv2.THRESH_BINARY_INV)
-    elif method == "TRUNC":
-        _, thresh = cv2.threshold(img_gray, 127, 255, cv2.THRESH_TRUNC)
-    elif method == "TOZERO":
-        _, thresh = cv2.threshold(img_gray, 127, 255, cv2.THRESH_TOZERO)
-    elif method == "TOZERO_INV":
-        _, thresh = cv2.threshold(img_gray, 127, 255, cv2.THRESH_TOZERO_INV)
-    else:
+    if method not in THRESHOLD_TYPES:
         raise ValueError("未知阈值操作")  # 如果方法未知，则抛出异常
-    return thresh  # 返回处理后的阈值图像
+    return run_operation("threshold", img_gray, method=method)  # 返回处理后的阈值图像
 
 def apply_filter(img, method):
     """应用滤波操作"""
-    # 根据选择的滤波方法，进行相应处理
-    if method == "均值滤波":
-        return cv2.blur(img, (3, 3))  # 应用均值滤波
-    elif method == "方框滤波":
-        return cv2.boxFilter(img, -1, (3, 3), normalize=False)  # 应用方框滤波
-    elif method == "高斯滤波":
-        return cv2.GaussianBlur(img, (5, 5), 1)  # 应用高斯滤波
-    elif method == "中值滤波":
-        return cv2.medianBlur(img, 5)  # 应用中值滤波
-    else:
+    if method not in FILTERS:
         raise ValueError("未知滤波操作")  # 如果方法未知，则抛出异常
+    return run_operation(method, img)  # 按界面名称执行对应的滤波
 
 # 主UI
 def main_ui():
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    from preview import ImagePreview
+
     global current_image, current_image_path
     current_image = None  # 初始化当前图像变量
     current_image_path = None  # 初始化当前图像路径
@@ -84,7 +101,7 @@ def main_ui():
             if not selected_method:  # 检查是否选择了方法
                 messagebox.showwarning("警告", "请先选择阈值处理方法")
                 return
-            img_gray = cv2.cvtColor(current_image, cv2.COLOR_BGR2GRAY)  # 将图像转换为灰度图像
+            img_gray = derived_cache.gray(current_image)  # 取（按图像缓存的）灰度图像
             result = apply_threshold(img_gray, selected_method)  # 应用阈值处理
             show_preview(result, f"阈值处理 - {selected_method}")  # 显示处理结果
         except Exception as e:
@@ -108,25 +125,7 @@ def main_ui():
 
     def show_preview(image, title=""):
         """显示图片预览"""
-        max_width, max_height = 800, 800  # 限制图片显示的最大宽度和高度
-        height, width = image.shape[:2]  # 获取图像的高度和宽度
-
-        # 计算缩放比例
-        scale = min(max_width / width, max_height / height, 1.0)
-        new_width = int(width * scale)  # 计算新宽度
-        new_height = int(height * scale)  # 计算新高度
-
-        # 调整图片大小以适配显示区域
-        resized_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-
-        # 转换为RGB模式并显示在Tkinter中
-        image_rgb = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB) if len(resized_image.shape) == 3 else resized_image
-        pil_image = Image.fromarray(image_rgb)  # 将OpenCV图像转换为PIL图像
-        tk_image = ImageTk.PhotoImage(pil_image)  # 将PIL图像转换为Tkinter可用格式
-
-        img_label.config(image=tk_image)  # 更新标签显示
-        img_label.image = tk_image  # 保持对图像的引用，防止被垃圾回收
-        img_label_title.config(text=title)  # 更新图像标题
+        preview.show(image, title)
 
     # 主窗口布局调整
     root = tk.Tk()  # 创建主窗口
@@ -169,9 +168,11 @@ def main_ui():
 
     img_label_title = tk.Label(root, text="", font=("Arial", 14))  # 创建标题标签
     img_label_title.pack(side=tk.BOTTOM, pady=5)  # 显示在底部
+    preview = ImagePreview(img_label, (800, 800), img_label_title)
 
     root.mainloop()  # 启动主循环
 
 
 # 启动UI
-main_ui()  # 调用主UI函数
+if __name__ == "__main__":
+    main_ui()  # 调用主UI函数
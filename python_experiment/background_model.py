@@ -1,21 +1,539 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import Manager
+
 import cv2
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinter import ttk
-from PIL import Image, ImageTk
+import numpy as np
+
+
+# 从前景掩码中提取运动目标外接矩形
+def find_boxes(mask, min_area=250):
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [cv2.boundingRect(c) for c in contours if cv2.contourArea(c) > min_area]
+
+
+# 在帧上绘制检测框
+def draw_boxes(frame, boxes, color=(0, 255, 0)):
+    for x, y, w, h in boxes:
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+    return frame
+
+
+# 以下检测器均返回 detect(frame) -> (前景掩码, 检测框列表)，掩码在模型预热阶段为 None
+def subtractor_detector(fgbg, scale=1.0, gray=False, min_area=250):
+    """用背景减除器检测运动目标。
+
+    scale < 1 时在缩小后的帧（gray 为真时再转灰度）上建模、开运算和找轮廓，面积阈值按 scale² 缩放，
+    检测框再映射回原分辨率；返回的掩码为分析分辨率。
+    """
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    area = min_area * scale * scale
+
+    def detect(frame):
+        small = frame
+        if scale != 1.0:
+            small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        if gray:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        fgmask = fgbg.apply(small)
+        fgmask = cv2.morphologyEx(fgmask, cv2.MORPH_OPEN, kernel)
+        boxes = find_boxes(fgmask, area)
+        if scale != 1.0:
+            boxes = [(int(x / scale), int(y / scale), int(round(w / scale)), int(round(h / scale)))
+                     for x, y, w, h in boxes]
+        return fgmask, boxes
+
+    return detect
+
+
+def gaussian_mixture_detector(scale=1.0, gray=False):
+    """高斯混合模型"""
+    return subtractor_detector(cv2.createBackgroundSubtractorMOG2(), scale, gray)
+
+
+def knn_detector(scale=1.0, gray=False):
+    """KNN 背景建模"""
+    return subtractor_detector(cv2.createBackgroundSubtractorKNN(), scale, gray)
+
+
+# 帧差法检测器：环形缓冲区 + 预分配的中间结果
+class FrameDifferenceDetector:
+    """两帧差法（frames=2）或三帧差法（frames=3）。
+
+    历史帧保存在预分配的环形缓冲区中，差分、灰度转换、阈值、腐蚀和膨胀都通过 dst= 写入固定的缓冲区，
+    稳定运行后不再为图像分配内存。默认与原实现一样先对彩色帧做差再转灰度；gray 为真时每帧先转灰度
+    再入缓冲区，计算量约为三分之一，但对亮度相近、颜色不同的运动目标不敏感。
+    返回的掩码是内部缓冲区，下一帧会被覆盖，需要保留时请自行复制。
+    """
+
+    def __init__(self, frames=2, gray=False, min_area=250):
+        self.frames = frames
+        self.gray = gray
+        self.min_area = min_area
+        self.ring = None
+        self.count = 0
+
+    def _allocate(self, shape):
+        height, width = shape[:2]
+        self.ring = np.empty((self.frames,) + shape, np.uint8)
+        self.delta = np.empty(self.ring.shape[1:], np.uint8)
+        self.delta2 = np.empty(self.ring.shape[1:], np.uint8)
+        self.delta_gray = np.empty((height, width), np.uint8)
+        self.mask = np.empty((height, width), np.uint8)
+        self.work = np.empty((height, width), np.uint8)
+        self.count = 0
+
+    def __call__(self, frame):
+        to_gray = frame.ndim == 3 and self.gray
+        shape = frame.shape[:2] if to_gray else frame.shape
+        if self.ring is None or self.ring.shape[1:] != shape:
+            self._allocate(shape)
+
+        current = self.count % self.frames
+        if to_gray:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.ring[current])
+        else:
+            np.copyto(self.ring[current], frame)
+        self.count += 1
+        if self.count < self.frames:  # 缓冲区尚未填满
+            return None, []
+
+        ring, delta = self.ring, self.delta
+        previous = ring[(current - 1) % self.frames]
+        if self.frames == 2:
+            cv2.absdiff(previous, ring[current], dst=delta)
+        else:
+            cv2.absdiff(ring[(current - 2) % self.frames], previous, dst=delta)
+            cv2.absdiff(previous, ring[current], dst=self.delta2)
+            cv2.bitwise_and(delta, self.delta2, dst=delta)
+        if delta.ndim == 3:
+            cv2.cvtColor(delta, cv2.COLOR_BGR2GRAY, dst=self.delta_gray)
+            delta = self.delta_gray
+
+        cv2.threshold(delta, 25, 255, cv2.THRESH_BINARY, dst=self.mask)
+        cv2.erode(self.mask, None, dst=self.work, iterations=1)
+        cv2.dilate(self.work, None, dst=self.mask, iterations=2)
+        return self.mask, find_boxes(self.mask, self.min_area)
+
+
+def two_frame_detector(gray=False):
+    """两帧差法"""
+    return FrameDifferenceDetector(2, gray)
+
+
+def three_frame_detector(gray=False):
+    """三帧差法"""
+    return FrameDifferenceDetector(3, gray)
+
+
+# 算法名 -> (检测器工厂, 检测框颜色)
+DETECTORS = {
+    "mog2": (gaussian_mixture_detector, (0, 255, 0)),
+    "knn": (knn_detector, (0, 0, 255)),
+    "two_frame": (two_frame_detector, (0, 255, 0)),
+    "three_frame": (three_frame_detector, (0, 255, 0)),
+}
+
+
+# 按算法名创建检测器，scale 只对背景减除类算法生效
+def create_detector(algorithm, scale=1.0, gray=False):
+    factory = DETECTORS[algorithm][0]
+    if factory in (gaussian_mixture_detector, knn_detector):
+        return factory(scale, gray)
+    return factory(gray)
+
+
+# 把检测器包装为“处理并标注一帧”的回调
+def annotating(detect, color):
+    def process_frame(frame):
+        _, boxes = detect(frame)
+        return draw_boxes(frame, boxes, color)
+
+    return process_frame
+
+
+# 逐帧读取视频文件或图片目录
+def iter_frames(source):
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith((".jpg", ".png", ".bmp")))
+        for name in names:
+            frame = cv2.imread(os.path.join(source, name), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise ValueError(f"无法读取图片：{name}")
+            yield frame
+        return
+    video = cv2.VideoCapture(source)
+    if not video.isOpened():
+        raise ValueError(f"无法打开视频：{source}")
+    try:
+        while True:
+            ret, frame = video.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        video.release()
+
+
+def open_writer(path, size, fps, is_color=True):
+    fourcc = cv2.VideoWriter_fourcc(*("mp4v" if path.lower().endswith(".mp4") else "MJPG"))
+    writer = cv2.VideoWriter(path, fourcc, fps, size, is_color)
+    if not writer.isOpened():
+        raise ValueError(f"无法写入视频：{path}")
+    return writer
+
+
+# 无界面运行背景建模，全速处理所有帧
+def run_headless(source, algorithm, boxes_path, mask_path=None, annotated_path=None, fps=25.0, scale=1.0,
+                 gray=False):
+    """对视频文件或图片目录运行指定算法，逐帧把检测框写入 JSONL，可选输出掩码视频和标注视频"""
+    _, color = DETECTORS[algorithm]
+    detect = create_detector(algorithm, scale, gray)
+    mask_writer = annotated_writer = None
+    count = 0
+    start = time.perf_counter()
+    try:
+        with open(boxes_path, "w", encoding="utf-8") as f:
+            for index, frame in enumerate(iter_frames(source)):
+                mask, boxes = detect(frame)
+                f.write(json.dumps({"frame": index, "boxes": [list(b) for b in boxes]}) + "\n")
+                size = (frame.shape[1], frame.shape[0])
+                if mask_path:
+                    mask_writer = mask_writer or open_writer(mask_path, size, fps, is_color=False)
+                    if mask is None:
+                        mask = np.zeros(frame.shape[:2], np.uint8)
+                    elif mask.shape[:2] != frame.shape[:2]:
+                        mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+                    mask_writer.write(mask)
+                if annotated_path:
+                    annotated_writer = annotated_writer or open_writer(annotated_path, size, fps)
+                    annotated_writer.write(draw_boxes(frame, boxes, color))
+                count += 1
+    finally:
+        for writer in (mask_writer, annotated_writer):
+            if writer is not None:
+                writer.release()
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    print(f"{algorithm}: 共处理 {count} 帧，用时 {elapsed:.2f} 秒，{rate:.1f} 帧/秒", file=sys.stderr)
+    return count
+
+
+# 多路视频：在工作进程中处理一路视频，检测事件分批发回主进程
+def _stream_worker(source, algorithm, events, scale=1.0, gray=False, batch_size=64):
+    detect = create_detector(algorithm, scale, gray)  # 每一路视频拥有独立的模型状态
+    batch = []
+    count = 0
+    start = time.perf_counter()
+    for index, frame in enumerate(iter_frames(source)):
+        _, boxes = detect(frame)
+        if boxes:
+            batch.append({"stream": source, "frame": index, "boxes": [list(b) for b in boxes]})
+            if len(batch) >= batch_size:
+                events.put(batch)
+                batch = []
+        count += 1
+    if batch:
+        events.put(batch)
+    return source, count, time.perf_counter() - start
+
+
+def _stream_cost(source):
+    """估计一路视频的工作量（帧数），用于把大任务先派发出去"""
+    if os.path.isdir(source):
+        return len(os.listdir(source))
+    video = cv2.VideoCapture(source)
+    frames = video.get(cv2.CAP_PROP_FRAME_COUNT) if video.isOpened() else 0
+    video.release()
+    return frames or (os.path.getsize(source) if os.path.exists(source) else 0)
+
+
+# 多路视频并行背景建模
+def run_streams(sources, algorithm, events_path, workers=None, scale=1.0, gray=False):
+    """每路视频在进程池中独立建模，所有路的检测事件（有检测框的帧）合并写入一个 JSONL 文件"""
+    workers = workers or os.cpu_count() or 1
+    # 按工作量从大到小派发，避免最长的一路最后才开始
+    sources = sorted(sources, key=_stream_cost, reverse=True)
+    total_frames = 0
+    start = time.perf_counter()
+
+    with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(events_path, "w", encoding="utf-8") as f:
+        events = manager.Queue()
+        pending = {pool.submit(_stream_worker, source, algorithm, events, scale, gray): source for source in sources}
+
+        def drain():
+            while not events.empty():
+                for event in events.get():
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+        while pending:
+            finished, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            drain()
+            for future in finished:
+                source = pending.pop(future)
+                try:
+                    _, count, elapsed = future.result()
+                except Exception as e:
+                    print(f"{source}: 处理失败：{e}", file=sys.stderr)
+                    continue
+                total_frames += count
+                print(f"{source}: {count} 帧，{count / max(elapsed, 1e-9):.1f} 帧/秒", file=sys.stderr)
+        drain()
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(sources)} 路视频共 {total_frames} 帧，用时 {elapsed:.2f} 秒，"
+          f"合计 {total_frames / max(elapsed, 1e-9):.1f} 帧/秒（{workers} 个进程）", file=sys.stderr)
+    return total_frames
+
+
+# 比较不同分析尺度下的速度与检测精度
+def benchmark_analysis_scale(source, algorithm="mog2", scales=(1.0, 0.5, 0.25), gray=False):
+    """以原分辨率的检测框为参照，统计各尺度的每帧耗时和召回率（IoU ≥ 0.5 视为命中）"""
+    frames = list(iter_frames(source))
+    if not frames:
+        raise ValueError(f"没有读取到帧：{source}")
+
+    def iou(a, b):
+        ax, ay, aw, ah = a
+        bx, by, bw, bh = b
+        iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+        ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+        inter = iw * ih
+        return inter / float(aw * ah + bw * bh - inter)
+
+    reference = None
+    base_time = None
+    for scale in scales:
+        detect = create_detector(algorithm, scale, gray and scale != 1.0)
+        start = time.perf_counter()
+        results = [detect(frame)[1] for frame in frames]
+        per_frame = (time.perf_counter() - start) / len(frames)
+        if reference is None:
+            reference, base_time = results, per_frame
+            print(f"{algorithm} 尺度 {scale:g}: {per_frame * 1000:.2f} ms/帧（参照）")
+            continue
+        total = sum(len(r) for r in reference)
+        hits = sum(1 for ref, got in zip(reference, results) for a in ref if any(iou(a, b) >= 0.5 for b in got))
+        recall = hits / total if total else 1.0
+        print(f"{algorithm} 尺度 {scale:g}{'（灰度）' if gray else ''}: {per_frame * 1000:.2f} ms/帧，"
+              f"加速 {base_time / per_frame:.1f} 倍，召回率 {recall:.1%}")
+
+
+# 比较逐帧分配内存的帧差实现与环形缓冲区实现
+def benchmark_frame_difference(source, repeat=3):
+    """统计两种实现的吞吐量，以及每帧处理过程中超出稳定占用的临时内存峰值（tracemalloc）"""
+    import tracemalloc
+
+    frames = list(iter_frames(source))
+    if len(frames) < 3:
+        raise ValueError(f"帧数不足：{source}")
+
+    def copying(history):
+        # 优化前的实现：每帧复制彩色帧，每一步都分配新数组
+        last = []
+
+        def detect(frame):
+            last.append(frame.copy())
+            if len(last) <= history:
+                return None, []
+            if history == 1:
+                delta = cv2.absdiff(last[0], frame)
+            else:
+                delta = cv2.bitwise_and(cv2.absdiff(last[0], last[1]), cv2.absdiff(last[1], frame))
+            del last[0]
+            thresh = cv2.cvtColor(delta, cv2.COLOR_BGR2GRAY)
+            thresh = cv2.threshold(thresh, 25, 255, cv2.THRESH_BINARY)[1]
+            thresh = cv2.erode(thresh, None, iterations=1)
+            thresh = cv2.dilate(thresh, None, iterations=2)
+            return thresh, find_boxes(thresh)
+
+        return detect
+
+    height, width = frames[0].shape[:2]
+    print(f"{source}: {len(frames)} 帧，{width}x{height}")
+    for name, history in (("两帧差法", 1), ("三帧差法", 2)):
+        for label, factory in (("逐帧分配", lambda: copying(history)),
+                               ("环形缓冲", lambda: FrameDifferenceDetector(history + 1)),
+                               ("灰度环形缓冲", lambda: FrameDifferenceDetector(history + 1, gray=True))):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                detect = factory()
+                for frame in frames:
+                    detect(frame)
+            rate = repeat * len(frames) / (time.perf_counter() - start)
+
+            # 预热后测量每帧的临时内存峰值
+            detect = factory()
+            for frame in frames[:3]:
+                detect(frame)
+            tracemalloc.start()
+            peak = 0
+            for frame in frames[3:]:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                detect(frame)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+            tracemalloc.stop()
+            print(f"  {name} {label}: {rate:.1f} 帧/秒，每帧临时内存峰值 {peak / 1024:.0f} KiB")
+
+
+# 帧率统计
+class RateMeter:
+    """按滑动时间窗口统计每秒处理的帧数"""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self.count = 0
+        self.start = time.perf_counter()
+        self.last_rate = None
+
+    def tick(self):
+        self.count += 1
+        elapsed = time.perf_counter() - self.start
+        if elapsed >= self.window:
+            self.last_rate = self.count / elapsed
+            self.count = 0
+            self.start = time.perf_counter()
+
+    @property
+    def rate(self):
+        if self.last_rate is not None:
+            return self.last_rate
+        elapsed = time.perf_counter() - self.start  # 第一个窗口尚未结束时按已用时间估算
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+
+# 解码 / 处理 / 显示三段流水线
+class VideoPipeline:
+    """解码线程 -> 处理线程 -> 显示（由 Tk 线程取最新帧）。
+
+    解码与处理之间是有界队列，队满时解码线程阻塞等待，保证背景模型拿到连续的帧；
+    处理与显示之间只保留最新的一帧，Tk 来不及显示的旧帧直接丢弃，界面不会被慢帧卡住。
+    后台线程出错时异常保存在 error 中，流水线随即结束，由显示端报告。
+    """
+
+    def __init__(self, video, process_frame, queue_size=8):
+        self.video = video
+        self.process_frame = process_frame
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.results = queue.Queue(maxsize=1)
+        self.stop_event = threading.Event()
+        self.finished = threading.Event()
+        self.error = None  # 解码或处理线程抛出的第一个异常
+        self.meters = {"解码": RateMeter(), "处理": RateMeter(), "显示": RateMeter()}
+        self.threads = [threading.Thread(target=self._decode, daemon=True),
+                        threading.Thread(target=self._process, daemon=True)]
+
+    def start(self):
+        for t in self.threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for q in (self.frames, self.results):  # 清空队列，唤醒阻塞在 put 上的线程
+            try:
+                while True:
+                    q.get_nowait()
+            except queue.Empty:
+                pass
+        for t in self.threads:
+            t.join(timeout=1.0)
+
+    def _put(self, q, item):
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(self, exc):
+        """记下第一个异常并让另一个线程退出，不再阻塞在队列上"""
+        if self.error is None:
+            self.error = exc
+        self.stop_event.set()
+
+    def _decode(self):
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = self.video.read()
+                if not ret:
+                    break
+                self.meters["解码"].tick()
+                if not self._put(self.frames, frame):
+                    return
+        except Exception as exc:
+            self._fail(exc)
+        finally:
+            self._put(self.frames, None)  # 结束标记
+
+    def _process(self):
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    frame = self.frames.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if frame is None:
+                    break
+                processed = self.process_frame(frame)
+                self.meters["处理"].tick()
+                # 只保留最新一帧：显示跟不上时丢掉旧帧
+                try:
+                    self.results.get_nowait()
+                except queue.Empty:
+                    pass
+                self.results.put(processed)
+        except Exception as exc:
+            self._fail(exc)
+        finally:
+            self.finished.set()
+
+    def latest(self):
+        """非阻塞地取出最新处理完成的帧，没有新帧时返回 None"""
+        try:
+            frame = self.results.get_nowait()
+        except queue.Empty:
+            return None
+        self.meters["显示"].tick()
+        return frame
+
+    def done(self):
+        return self.finished.is_set() and self.results.empty()
+
+    def fps_text(self):
+        return "  ".join(f"{name} {meter.rate:.1f} FPS" for name, meter in self.meters.items())
+
+
+def import_ui():
+    """创建界面前才导入 Tk 和预览组件，只调用检测函数的进程（包括多路视频的工作进程）不会加载它们"""
+    global tk, ttk, filedialog, messagebox, ImagePreview
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    from preview import ImagePreview
 
 
 class BackgroundModelingApp:
     def __init__(self, root):
+        import_ui()
         self.root = root
         self.root.title("背景建模工具")
         self.root.geometry("1000x700")
 
         self.video = None  # 保存视频对象
-        self.last_frame = None  # 保存两帧差法的上一帧
-        self.last_frames = [None, None]  # 保存三帧差法的前两帧
 
         self.canvas = None  # 用于显示视频的画布
+        self.pipeline = None  # 当前运行的视频流水线
         self.create_ui()
 
     def create_ui(self):
@@ -39,6 +557,8 @@ class BackgroundModelingApp:
         # 在视频显示区域创建一个 Canvas 用于显示视频
         self.canvas = tk.Canvas(self.video_frame, bg="black")
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        # 按原尺寸显示，所有帧共用一个画布图像项；视频帧不会重复，不做内容缓存
+        self.preview = ImagePreview(self.canvas, None, cache_size=0)
 
         # 显示视频加载状态
         self.status_label = tk.Label(self.root, text="", font=("Arial", 14))
@@ -48,6 +568,7 @@ class BackgroundModelingApp:
         """加载视频文件"""
         file_path = filedialog.askopenfilename(title="加载视频", filetypes=[("视频文件", "*.mp4 *.avi"), ("所有文件", "*.*")])
         if file_path:
+            self.stop_pipeline()
             self.video = cv2.VideoCapture(file_path)
             self.status_label.config(text=f"已加载视频: {file_path}")
             messagebox.showinfo("加载成功", f"已加载视频: {file_path}")
@@ -57,132 +578,91 @@ class BackgroundModelingApp:
 
     def display_frame(self, frame):
         """在 Canvas 上显示视频帧"""
-        # 转换 BGR 到 RGB 格式
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        # 将 OpenCV 图像转换为 PIL 图像
-        frame_image = Image.fromarray(frame_rgb)
-        # 将 PIL 图像转换为 Tkinter 图像
-        frame_tk = ImageTk.PhotoImage(frame_image)
-        # 在 Canvas 上显示图像
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=frame_tk)
-        self.canvas.image = frame_tk
+        self.preview.show(frame)
+
+    def stop_pipeline(self):
+        """停止正在运行的视频流水线"""
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
 
     def process_video(self, process_frame_callback):
-        """通用视频处理逻辑"""
+        """通用视频处理逻辑：解码和处理在后台线程进行，Tk 线程只负责显示最新帧"""
         if self.video is None or not self.video.isOpened():
             messagebox.showwarning("警告", "请先加载视频！")
             return
 
+        self.stop_pipeline()
+        pipeline = self.pipeline = VideoPipeline(self.video, process_frame_callback).start()
+
         def update_frame():
-            ret, frame = self.video.read()
-            if not ret:
-                self.status_label.config(text="视频播放完成")
+            if pipeline is not self.pipeline:  # 已被新的处理任务替换
                 return
-
-            # 调用具体的处理函数
-            processed_frame = process_frame_callback(frame)
-
-            # 显示处理后的帧
-            self.display_frame(processed_frame)
-
-            # 每 30 毫秒更新一次帧
-            self.root.after(30, update_frame)
+            if pipeline.error is not None:
+                self.stop_pipeline()
+                self.status_label.config(text=f"视频处理出错：{pipeline.error}")
+                messagebox.showerror("错误", f"视频处理出错：{pipeline.error}")
+                return
+            frame = pipeline.latest()
+            if frame is not None:
+                self.display_frame(frame)
+                self.status_label.config(text=pipeline.fps_text())
+            if pipeline.done():
+                self.status_label.config(text=f"视频播放完成（{pipeline.fps_text()}）")
+                self.pipeline = None
+                return
+            self.root.after(5, update_frame)
 
         update_frame()
 
     def gaussian_mixture_modeling(self):
         """高斯混合模型"""
-        fgbg = cv2.createBackgroundSubtractorMOG2()
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-
-        def process_frame(frame):
-            fgmask = fgbg.apply(frame)
-            fgmask = cv2.morphologyEx(fgmask, cv2.MORPH_OPEN, kernel)
-            contours, _ = cv2.findContours(fgmask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            for c in contours:
-                if cv2.contourArea(c) > 250:
-                    x, y, w, h = cv2.boundingRect(c)
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            return frame
-
-        self.process_video(process_frame)
+        self.process_video(annotating(gaussian_mixture_detector(), (0, 255, 0)))
 
     def knn_background_modeling(self):
         """KNN 背景建模"""
-        fgbg = cv2.createBackgroundSubtractorKNN()
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-
-        def process_frame(frame):
-            fgmask = fgbg.apply(frame)
-            fgmask = cv2.morphologyEx(fgmask, cv2.MORPH_OPEN, kernel)
-            contours, _ = cv2.findContours(fgmask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            for c in contours:
-                if cv2.contourArea(c) > 250:
-                    x, y, w, h = cv2.boundingRect(c)
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
-            return frame
-
-        self.process_video(process_frame)
+        self.process_video(annotating(knn_detector(), (0, 0, 255)))
 
     def two_frame_difference(self):
         """两帧差法"""
-        self.last_frame = None
-
-        def process_frame(frame):
-            if self.last_frame is None:
-                self.last_frame = frame
-                return frame
-
-            frame_delta = cv2.absdiff(self.last_frame, frame)
-            self.last_frame = frame.copy()
-
-            thresh = cv2.cvtColor(frame_delta, cv2.COLOR_BGR2GRAY)
-            thresh = cv2.threshold(thresh, 25, 255, cv2.THRESH_BINARY)[1]
-            thresh = cv2.erode(thresh, None, iterations=1)
-            thresh = cv2.dilate(thresh, None, iterations=2)
-
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            for c in contours:
-                if cv2.contourArea(c) > 250:
-                    x, y, w, h = cv2.boundingRect(c)
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            return frame
-
-        self.process_video(process_frame)
+        self.process_video(annotating(two_frame_detector(), (0, 255, 0)))
 
     def three_frame_difference(self):
         """三帧差法"""
-        self.last_frames = [None, None]
-
-        def process_frame(frame):
-            if self.last_frames[0] is None:
-                self.last_frames[0] = frame
-                return frame
-            if self.last_frames[1] is None:
-                self.last_frames[1] = frame
-                return frame
-
-            frame_delta1 = cv2.absdiff(self.last_frames[0], self.last_frames[1])
-            frame_delta2 = cv2.absdiff(self.last_frames[1], frame)
-            self.last_frames[0], self.last_frames[1] = self.last_frames[1], frame
-
-            thresh = cv2.bitwise_and(frame_delta1, frame_delta2)
-            thresh = cv2.cvtColor(thresh, cv2.COLOR_BGR2GRAY)
-            thresh = cv2.threshold(thresh, 25, 255, cv2.THRESH_BINARY)[1]
-            thresh = cv2.erode(thresh, None, iterations=1)
-            thresh = cv2.dilate(thresh, None, iterations=2)
-
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            for c in contours:
-                if cv2.contourArea(c) > 250:
-                    x, y, w, h = cv2.boundingRect(c)
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            return frame
-
-        self.process_video(process_frame)
-
-
-# 启动 Tkinter 应用
-root = tk.Tk()
-app = BackgroundModelingApp(root)
-root.mainloop()
+        self.process_video(annotating(three_frame_detector(), (0, 255, 0)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="背景建模工具，不带参数时启动图形界面")
+    parser.add_argument("sources", nargs="*", help="视频文件或按文件名排序的图片目录，多路时并行处理")
+    parser.add_argument("-a", "--algorithm", choices=list(DETECTORS), default="mog2", help="背景建模算法")
+    parser.add_argument("--boxes", default="boxes.jsonl", help="逐帧检测框输出（JSONL）")
+    parser.add_argument("--mask", help="可选：前景掩码视频输出路径")
+    parser.add_argument("--annotated", help="可选：标注检测框后的视频输出路径")
+    parser.add_argument("--fps", type=float, default=25.0, help="输出视频的帧率")
+    parser.add_argument("--scale", type=float, default=1.0, help="MOG2/KNN 的分析尺度，如 0.5 表示在半分辨率上建模")
+    parser.add_argument("--gray", action="store_true", help="在灰度帧上建模 / 做帧差")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="MOG2/KNN 比较不同分析尺度下的速度与召回率；帧差法比较两种实现的吞吐量与内存分配")
+    parser.add_argument("--events", default="events.jsonl", help="多路视频时合并输出的检测事件（JSONL）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="多路视频时的工作进程数，默认使用全部 CPU 核心")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.benchmark and args.sources and args.algorithm in ("two_frame", "three_frame"):
+        benchmark_frame_difference(args.sources[0])
+    elif args.benchmark and args.sources:
+        benchmark_analysis_scale(args.sources[0], args.algorithm, gray=args.gray)
+    elif len(args.sources) > 1:
+        run_streams(args.sources, args.algorithm, args.events, args.workers, args.scale, args.gray)
+    elif args.sources:
+        run_headless(args.sources[0], args.algorithm, args.boxes, args.mask, args.annotated, args.fps, args.scale,
+                     args.gray)
+    else:
+        # 启动 Tkinter 应用
+        import_ui()
+        root = tk.Tk()
+        app = BackgroundModelingApp(root)
+        root.mainloop()
@@ -1,10 +1,14 @@
-import tkinter as tk  # 导入Tkinter库，用于创建图形用户界面
-from tkinter import filedialog, messagebox  # 导入文件对话框和消息框，用于打开文件和显示消息
-from tkinter import ttk  # 导入ttk模块，用于更现代的样式组件
+import argparse  # 命令行参数解析
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor  # 条带并行处理
+
 import cv2  # 导入OpenCV库，用于图像处理
-from PIL import Image, ImageTk  # 导入PIL库，用于图像处理和与Tkinter兼容的图像显示
 import numpy as np  # 导入NumPy库，用于处理图像数据
 
+from operations import Param, register, run_operation
+
 # 用来显示的全局变量
 current_image = None  # 当前显示的图像
 current_image_path = None  # 当前图像的文件路径
@@ -28,27 +32,85 @@ def add_border(image, top, bottom, left, right, border_type, value=0):
     return bordered_image  # 返回加了边框的图像
 
 # 调整亮度与对比度
-def adjust_brightness_contrast(image, brightness=0, contrast=1.0):
+@register("brightness_contrast", Param("brightness", float, 0), Param("contrast", float, 1.0), label="调整亮度/对比度")
+def adjust_brightness_contrast(image, brightness=0, contrast=1.0, dst=None):
     blank = np.zeros_like(image)  # 创建一个与图像大小相同的黑色图像
     blank[:, :] = brightness  # 将黑色图像设置为指定的亮度值
-    adjusted = cv2.addWeighted(image, contrast, blank, 0, 0)  # 调整图像亮度与对比度
+    adjusted = cv2.addWeighted(image, contrast, blank, 0, 0, dst=dst)  # 调整图像亮度与对比度
     return adjusted  # 返回调整后的图像
 
+# 均衡化查找表，与 cv2.equalizeHist 的计算方式一致（单精度缩放后四舍五入到偶数）
+def equalize_lut(hist):
+    hist = hist.astype(np.int64)
+    first = int(np.flatnonzero(hist)[0])
+    total = int(hist.sum())
+    lut = np.zeros(256, np.uint8)
+    if hist[first] == total:  # 只有一个灰度级
+        lut[:] = first
+        return lut
+    scale = np.float32(255) / np.float32(total - hist[first])
+    cumulative = np.cumsum(hist[first + 1:])
+    lut[first + 1:] = np.clip(np.rint(cumulative.astype(np.float32) * scale), 0, 255)
+    return lut
+
 # 彩色图片直方图均衡化
-def equalize_color_histogram(image):
-    b, g, r = cv2.split(image)  # 分离图像的蓝色、绿色和红色通道
-    b_eq = cv2.equalizeHist(b)  # 对蓝色通道进行直方图均衡化
-    g_eq = cv2.equalizeHist(g)  # 对绿色通道进行直方图均衡化
-    r_eq = cv2.equalizeHist(r)  # 对红色通道进行直方图均衡化
-    equalized_image = cv2.merge((b_eq, g_eq, r_eq))  # 合并均衡化后的三个通道
-    return equalized_image  # 返回均衡化后的图像
+@register("equalize_hist", Param("workers", int, 1), label="直方图均衡化")
+def equalize_color_histogram(image, workers=1, strip_rows=512, out=None):
+    """直接在交错存储的 BGR 图像上均衡化，不拆分/合并通道。
+
+    先按条带统计三个通道的直方图，再用一张 256x3 的查找表一次性写入 out（可以就是 image 本身），
+    workers > 1 时条带分给线程池并行处理。结果与逐通道 cv2.equalizeHist 相同。
+    """
+    if image.ndim == 2:  # 灰度图直接均衡化
+        return cv2.equalizeHist(image, dst=out)
+    if out is None:
+        out = np.empty_like(image)
+    rows, cols = image.shape[:2]
+    strip_rows = max(1, min(strip_rows, (1 << 24) // max(cols, 1)))  # 单条带计数不超过 float32 的精确范围
+    strips = [slice(start, start + strip_rows) for start in range(0, rows, strip_rows)]
+
+    def strip_hist(rows_slice):
+        block = image[rows_slice]
+        return np.stack([cv2.calcHist([block], [c], None, [256], [0, 256]).ravel() for c in range(3)]).astype(np.int64)
+
+    def strip_lut(rows_slice):
+        cv2.LUT(image[rows_slice], lut, dst=out[rows_slice])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        hist = sum(pool.map(strip_hist, strips))
+        lut = np.stack([equalize_lut(h) for h in hist], axis=-1).reshape(1, 256, 3)
+        list(pool.map(strip_lut, strips))
+    return out  # 返回均衡化后的图像
+
+# 比较逐通道 split/merge 与条带并行均衡化
+def benchmark_equalization(image, repeat=10):
+    def legacy(img):
+        return cv2.merge([cv2.equalizeHist(channel) for channel in cv2.split(img)])
+
+    reference = legacy(image)
+    out = np.empty_like(image)
+    timings = [("split/merge", lambda: legacy(image))]
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        timings.append((f"条带 {workers} 线程", lambda w=workers: equalize_color_histogram(image, w, out=out)))
+    print(f"图像 {image.shape[1]}x{image.shape[0]}，CPU 核心数 {os.cpu_count()}")
+    baseline = None
+    for name, fn in timings:
+        result = fn()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = (time.perf_counter() - start) / repeat
+        baseline = baseline or elapsed
+        diff = int(np.abs(result.astype(np.int16) - reference).max())
+        print(f"  {name}: {elapsed * 1000:.1f} ms/次，加速比 {baseline / elapsed:.2f}，与逐通道结果最大差 {diff}")
 
 # 缩放图片
-def resize_image(img, width=None, height=None, fx=1, fy=1):
+@register("resize", Param("width", int, None), Param("height", int, None), Param("fx", float, 1), Param("fy", float, 1), label="缩放")
+def resize_image(img, width=None, height=None, fx=1, fy=1, dst=None):
     if width and height:  # 如果给定了宽度和高度
-        resized = cv2.resize(img, (width, height))  # 按指定的宽高进行缩放
+        resized = cv2.resize(img, (width, height), dst=dst)  # 按指定的宽高进行缩放
     else:
-        resized = cv2.resize(img, (0, 0), fx=fx, fy=fy)  # 按比例缩放
+        resized = cv2.resize(img, (0, 0), dst=dst, fx=fx, fy=fy)  # 按比例缩放
     return resized  # 返回缩放后的图像
 
 # 图像融合
@@ -76,6 +138,10 @@ def play_video(video_path):
 
 # Tkinter 主界面
 def main_ui():
+    import tkinter as tk  # 启动界面时才导入Tkinter库，处理函数可以在没有图形环境的进程中直接导入
+    from tkinter import filedialog, messagebox, ttk  # 导入文件对话框、消息框和ttk模块
+    from preview import ImagePreview  # 导入各界面共用的图像预览组件
+
     def open_image():
         global current_image, current_image_path
         file_path = filedialog.askopenfilename(title="选择图片", filetypes=[("Image Files", "*.jpg *.png *.bmp")])  # 打开文件对话框选择图片
@@ -106,16 +172,8 @@ def main_ui():
             messagebox.showwarning("警告", "请先加载图片")  # 弹出警告
             return
         try:
-            if action == "灰度化":
-                processed_image = cv2.cvtColor(current_image, cv2.COLOR_BGR2GRAY)  # 转为灰度图
-            elif action == "调整亮度/对比度":
-                processed_image = adjust_brightness_contrast(current_image, brightness=50, contrast=1.2)  # 调整亮度与对比度
-            elif action == "直方图均衡化":
-                processed_image = equalize_color_histogram(current_image)  # 直方图均衡化
-            elif action == "缩放":
-                processed_image = resize_image(current_image, fx=0.5, fy=0.5)  # 缩放图像
-            else:
-                raise ValueError("未知操作")  # 如果未知操作类型
+            params = {"调整亮度/对比度": dict(brightness=50, contrast=1.2), "缩放": dict(fx=0.5, fy=0.5)}.get(action, {})
+            processed_image = run_operation(action, current_image, **params)  # 按界面名称执行注册的操作
             current_image = processed_image  # 更新当前图像
             show_preview(processed_image, f"{action} 后的图像")  # 显示处理后的图像
         except Exception as e:  # 捕获异常
@@ -201,19 +259,7 @@ def main_ui():
             messagebox.showerror("错误", str(e))  # 弹出错误信息
 
     def show_preview(image, title=""):
-        max_width, max_height = 800, 800  # 设置图像预览的最大宽度和高度
-        height, width = image.shape[:2]  # 获取图像的高度和宽度
-        scale = min(max_width / width, max_height / height, 1.0)  # 根据图像尺寸计算缩放比例
-        new_width = int(width * scale)  # 计算新的宽度
-        new_height = int(height * scale)  # 计算新的高度
-        resized_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)  # 缩放图像
-        image_rgb = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB) if len(
-            resized_image.shape) == 3 else resized_image  # 转换为RGB模式，以便在Tkinter中显示
-        pil_image = Image.fromarray(image_rgb)  # 将NumPy数组转换为PIL图像
-        tk_image = ImageTk.PhotoImage(pil_image)  # 将PIL图像转换为Tkinter兼容的图像
-        img_label.config(image=tk_image)  # 设置标签显示图像
-        img_label.image = tk_image  # 保持对图像的引用，以防被垃圾回收
-        img_label_title.config(text=title)  # 更新标题标签显示当前图像的描述
+        preview.show(image, title)  # 缩放与颜色转换的结果会被缓存，并复用同一个 PhotoImage
 
     # 主窗口布局调整
     root = tk.Tk()  # 创建Tkinter的主窗口
@@ -289,8 +335,16 @@ def main_ui():
 
     img_label_title = tk.Label(root, text="", font=("Arial", 16))  # 创建一个标题标签
     img_label_title.pack(side=tk.BOTTOM, pady=5)  # 将标题标签放置在窗口底部，并设置上下边距
+    preview = ImagePreview(img_label, (800, 800), img_label_title)  # 图像预览组件
 
     root.mainloop()  # 启动Tkinter的主事件循环，开始运行GUI
 
-# 启动UI
-main_ui()  # 调用主界面函数，启动图像和视频操作工具的UI
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="图像和视频操作工具，不带参数时启动图形界面")
+    parser.add_argument("--benchmark-equalize", metavar="IMAGE", help="比较 split/merge 与条带并行直方图均衡化的耗时")
+    args = parser.parse_args()
+    if args.benchmark_equalize:
+        benchmark_equalization(read_image(args.benchmark_equalize))
+        sys.exit()
+    # 启动UI
+    main_ui()  # 调用主界面函数，启动图像和视频操作工具的UI
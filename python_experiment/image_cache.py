@@ -0,0 +1,191 @@
+"""按图像缓存派生数据
+
+同一张载入的图像在界面上会被反复点击处理，每次都重新转灰度、转浮点、算频谱或直方图。
+DerivedCache 以图像对象为键保存这些派生结果，按最近最少使用淘汰，总字节数不超过 max_bytes。
+"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+
+def version_stamp(image, samples=64):
+    """图像的版本戳：数据地址、形状、类型加上约 samples×samples 个采样点的哈希。
+
+    只读取少量像素，开销可以忽略；能发现大多数原地修改，但改动恰好避开所有采样点时发现不了，
+    这种情况需要调用 DerivedCache.invalidate。
+    """
+    step_y = max(1, image.shape[0] // samples)
+    step_x = max(1, image.shape[1] // samples) if image.ndim > 1 else 1
+    sample = image[::step_y, ::step_x] if image.ndim > 1 else image[::step_y]
+    return image.shape, image.dtype.str, image.__array_interface__["data"][0], hash(sample.tobytes())
+
+
+def _freeze(value):
+    """把缓存的数组设为只读，防止调用方原地修改后污染缓存"""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _freeze(item)
+    return value
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+
+class DerivedCache:
+    """以 (图像对象, 派生名称) 为键的 LRU 缓存。
+
+    图像被回收或版本戳变化（原地修改）时，它的所有派生结果一起作废；缓存的数组都是只读的。
+    派生结果本身也可以作为键，例如灰度图的金字塔以缓存的灰度图为键。可以在多个线程中使用。
+    版本戳只采样部分像素，会被整张覆盖的缓冲区（如流水线的中间结果）要在 bypass() 中处理。
+    """
+
+    def __init__(self, max_bytes=256 << 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (id(图像), 名称) -> (派生结果, 字节数)
+        self._images = {}  # id(图像) -> (弱引用, 版本戳)
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check(self, image):
+        """登记图像并核对版本，图像换了或被修改过时先丢掉旧的派生结果"""
+        key, stamp = id(image), version_stamp(image)
+        with self._lock:
+            record = self._images.get(key)
+            if record is None or record[0]() is not image or record[1] != stamp:
+                self._drop(key)
+                self._images[key] = (weakref.ref(image, lambda _, k=key: self._drop(k, True)), stamp)
+        return key
+
+    def _drop(self, key, dead=False):
+        with self._lock:
+            for entry in [k for k in self._entries if k[0] == key]:
+                self.nbytes -= self._entries.pop(entry)[1]
+            if dead:
+                self._images.pop(key, None)
+
+    @contextmanager
+    def bypass(self):
+        """在 with 块中（仅限当前线程）不查找也不保存缓存，每次都直接计算"""
+        previous = getattr(self._local, "bypass", False)
+        self._local.bypass = True
+        try:
+            yield self
+        finally:
+            self._local.bypass = previous
+
+    def get(self, image, name, compute):
+        """取 image 名为 name 的派生结果，没有时调用 compute(image) 计算并缓存"""
+        if getattr(self._local, "bypass", False):
+            return compute(image)
+        key = (self._check(image), name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        value = _freeze(compute(image))
+        size = _nbytes(value)
+        with self._lock:
+            if size <= self.max_bytes and key[0] in self._images and key not in self._entries:
+                self._entries[key] = (value, size)
+                self.nbytes += size
+                while self.nbytes > self.max_bytes:
+                    self.nbytes -= self._entries.popitem(last=False)[1][1]
+        return value
+
+    def invalidate(self, image=None):
+        """原地修改图像后调用；image 为 None 时清空整个缓存"""
+        with self._lock:
+            if image is None:
+                self._entries.clear()
+                self._images.clear()
+                self.nbytes = 0
+            else:
+                self._drop(id(image), True)
+
+    def gray(self, image):
+        """灰度图，已经是灰度图时原样返回"""
+        if image.ndim == 2:
+            return image
+        return self.get(image, "gray", lambda img: cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+    def float32(self, image):
+        """float32 的灰度图"""
+        return self.get(image, "float32", lambda img: self.gray(img).astype(np.float32))
+
+    def hist(self, image):
+        """各通道 256 个 bin 的直方图，形状为 (通道数, 256)，与 cv2.calcHist 的结果相同"""
+        def compute(img):
+            channels = 1 if img.ndim == 2 else img.shape[2]
+            return np.stack([cv2.calcHist([img], [c], None, [256], [0, 256]).ravel() for c in range(channels)])
+        return self.get(image, "hist", compute)
+
+    def pyramid(self, image, levels):
+        """高斯金字塔 (原图, 第 1 层, ..., 第 levels 层)，逐层 pyrDown"""
+        def compute(img):
+            layers = []
+            for _ in range(levels):
+                layers.append(cv2.pyrDown(layers[-1] if layers else img))
+            return tuple(layers)
+        # 缓存中不能持有原图本身，否则原图永远不会被回收
+        return (image,) + self.get(image, ("pyramid", levels), compute)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return (f"{len(self._entries)} 项，{self.nbytes / 2 ** 20:.1f} MB / {self.max_bytes / 2 ** 20:.0f} MB，"
+                f"命中率 {self.hits / total if total else 0:.0%}")
+
+
+derived_cache = DerivedCache()  # 各模块共用的派生数据缓存
+
+
+def benchmark_derived_cache(image, clicks=20):
+    """模拟在同一张图上反复点击 Canny、阈值、金字塔匹配、直方图、频域滤波等按钮，
+    比较每次重新转灰度/浮点与使用派生数据缓存的耗时"""
+    def legacy():
+        cv2.Canny(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), 50, 150)
+        cv2.threshold(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), 127, 255, cv2.THRESH_BINARY)
+        cv2.pyrDown(cv2.pyrDown(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)))
+        cv2.calcHist([cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)], [0], None, [256], [0, 256])
+        np.fft.rfft2(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY).astype(np.float32))
+
+    cache = DerivedCache()
+
+    def cached():
+        cv2.Canny(cache.gray(image), 50, 150)
+        cv2.threshold(cache.gray(image), 127, 255, cv2.THRESH_BINARY)
+        cache.pyramid(cache.gray(image), 2)
+        cache.hist(cache.gray(image))
+        cache.get(image, "rfft2", lambda img: np.fft.rfft2(cache.float32(img)))
+
+    for name, fn in (("每次重新转换", legacy), ("派生数据缓存", cached)):
+        start = time.perf_counter()
+        for _ in range(clicks):
+            fn()
+        print(f"  {name}: {(time.perf_counter() - start) / clicks * 1000:.2f} ms/轮")
+    print(f"  缓存：{cache.stats()}")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark_derived_cache(cv2.imread(sys.argv[1] if len(sys.argv) > 1 else "examples/lenna.jpg"))
@@ -1,14 +1,26 @@
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinter import ttk
-from PIL import Image, ImageTk
 
+from image_cache import derived_cache
+from operations import Param, register, run_operation, size
+
+
+# 直方图曲线各点的 x 坐标（与原逐段画线的坐标一致）
+HIST_X = (50 + np.arange(256) * (340 / 256)).astype(np.int32)
+HIST_COLORS = ((255, 0, 0), (0, 255, 0), (0, 0, 255))
 
-def calc_gray_hist(img):
-    """计算灰度图直方图，设置背景为白色并标注坐标轴"""
-    hist = cv2.calcHist([img], [0], None, [256], [0, 256])
+
+@lru_cache(maxsize=1)
+def hist_axes():
+    """白色背景上的坐标轴与刻度只绘制一次，返回 (画布, 坐标轴像素掩码)"""
     hist_img = np.full((320, 400, 3), 255, dtype=np.uint8)  # 创建白色背景图像
 
     # 绘制坐标轴
@@ -26,143 +38,430 @@ def calc_gray_hist(img):
         cv2.line(hist_img, (x, 290), (x, 295), (0, 0, 0), 1)
         cv2.putText(hist_img, str(i), (x - 10, 310), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 1)
 
-    # 归一化直方图高度
-    cv2.normalize(hist, hist, 0, 280, cv2.NORM_MINMAX)
+    hist_img.flags.writeable = False
+    return hist_img, hist_img[:, :, 0] < 255
 
-    # 绘制直方图
-    for i in range(1, 256):
-        value1 = int(hist[i - 1].item())
-        value2 = int(hist[i].item())
-        x1 = int(50 + (i - 1) * (340 / 256))
-        x2 = int(50 + i * (340 / 256))
-        cv2.line(hist_img, (x1, 290 - value1), (x2, 290 - value2), (0, 0, 0), 1)
-    return hist_img
 
+def hist_curve(hist):
+    """把 256 个 bin 归一化为曲线上的点，供一次 polylines 绘制"""
+    hist = cv2.normalize(hist.reshape(-1, 1).astype(np.float32), None, 0, 280, cv2.NORM_MINMAX)
+    ys = 290 - hist.ravel().astype(np.int32)  # 与 int() 一样向零取整
+    return np.stack([HIST_X, ys], axis=1).reshape(-1, 1, 2)
 
-def calc_color_hist(img):
-    """计算三通道直方图，设置背景为白色并标注坐标轴"""
-    hist_img = np.full((320, 400, 3), 255, dtype=np.uint8)  # 创建白色背景图像
-    color = ('b', 'g', 'r')
-    for i, col in enumerate(color):
-        hist = cv2.calcHist([img], [i], None, [256], [0, 256])
-        cv2.normalize(hist, hist, 0, 280, cv2.NORM_MINMAX)
 
-        # 绘制直方图
-        for j in range(1, 256):
-            value1 = int(hist[j - 1].item())
-            value2 = int(hist[j].item())
-            x1 = int(50 + (j - 1) * (340 / 256))
-            x2 = int(50 + j * (340 / 256))
-            cv2.line(hist_img,
-                     (x1, 290 - value1), (x2, 290 - value2),
-                     (255, 0, 0) if col == 'b' else (0, 255, 0) if col == 'g' else (0, 0, 255), 1)
+@register("gray_hist", input="gray", label="灰度直方图")
+def calc_gray_hist(img, raw=False):
+    """计算灰度图直方图，设置背景为白色并标注坐标轴；raw 为真时只返回 256 个 bin 的计数（按图像缓存，只读）"""
+    hist = derived_cache.hist(img)[0]
+    if raw:
+        return hist
+    hist_img = hist_axes()[0].copy()
+    cv2.polylines(hist_img, [hist_curve(hist)], False, (0, 0, 0), 1)
+    return hist_img
 
-    # 绘制坐标轴
-    cv2.line(hist_img, (50, 10), (50, 290), (0, 0, 0), 2)  # y 轴
-    cv2.line(hist_img, (50, 290), (390, 290), (0, 0, 0), 2)  # x 轴
 
-    # 标注 y 轴刻度
-    for i in range(0, 301, 50):
-        cv2.line(hist_img, (45, 290 - i), (50, 290 - i), (0, 0, 0), 1)
-        cv2.putText(hist_img, str(i), (5, 295 - i), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 1)
+@register("color_hist", label="三通道直方图")
+def calc_color_hist(img, raw=False):
+    """计算三通道直方图，设置背景为白色并标注坐标轴；raw 为真时只返回 (3, 256) 的 B/G/R 计数（按图像缓存，只读）"""
+    hists = derived_cache.hist(img)
+    if raw:
+        return hists
+    axes, axes_mask = hist_axes()
+    hist_img = axes.copy()
+    for hist, color in zip(hists, HIST_COLORS):
+        cv2.polylines(hist_img, [hist_curve(hist)], False, color, 1)
+    hist_img[axes_mask] = axes[axes_mask]  # 坐标轴画在曲线之上
+    return hist_img
 
-    # 标注 x 轴刻度
-    for i in range(0, 256, 50):
-        x = int(50 + i * (340 / 256))
-        cv2.line(hist_img, (x, 290), (x, 295), (0, 0, 0), 1)
-        cv2.putText(hist_img, str(i), (x - 10, 310), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 1)
 
-    return hist_img
+# 比较逐段画线与缓存坐标轴 + polylines 的刷新耗时（新实现的直方图数值按图像缓存）
+def benchmark_histogram_render(img, repeat=200):
+    def legacy_gray_hist(gray):
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+        hist_img = np.full((320, 400, 3), 255, dtype=np.uint8)
+        cv2.line(hist_img, (50, 10), (50, 290), (0, 0, 0), 2)
+        cv2.line(hist_img, (50, 290), (390, 290), (0, 0, 0), 2)
+        for i in range(0, 301, 50):
+            cv2.line(hist_img, (45, 290 - i), (50, 290 - i), (0, 0, 0), 1)
+            cv2.putText(hist_img, str(i), (5, 295 - i), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 1)
+        for i in range(0, 256, 50):
+            x = int(50 + i * (340 / 256))
+            cv2.line(hist_img, (x, 290), (x, 295), (0, 0, 0), 1)
+            cv2.putText(hist_img, str(i), (x - 10, 310), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 1)
+        cv2.normalize(hist, hist, 0, 280, cv2.NORM_MINMAX)
+        for i in range(1, 256):
+            value1 = int(hist[i - 1].item())
+            value2 = int(hist[i].item())
+            x1 = int(50 + (i - 1) * (340 / 256))
+            x2 = int(50 + i * (340 / 256))
+            cv2.line(hist_img, (x1, 290 - value1), (x2, 290 - value2), (0, 0, 0), 1)
+        return hist_img
 
-def apply_clahe(img):
-    """应用 CLAHE 并返回结果"""
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    result = clahe.apply(gray)
+    same = np.array_equal(legacy_gray_hist(gray), calc_gray_hist(gray))
+    for name, fn in (("逐段画线", lambda: legacy_gray_hist(gray)), ("polylines", lambda: calc_gray_hist(gray)),
+                     ("仅数值", lambda: cv2.calcHist([gray], [0], None, [256], [0, 256])),
+                     ("三通道 polylines", lambda: calc_color_hist(img))):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        print(f"  {name}: {(time.perf_counter() - start) / repeat * 1000:.3f} ms/次")
+    print(f"  灰度直方图与原实现逐像素{'一致' if same else '不一致'}")
+
+
+# 分块累计的直方图
+class HistogramAccumulator:
+    """按条带 / 分块累计 256 bin 直方图，各线程的部分结果可以 merge 到一起。
+
+    计数使用 int64，结果与对整幅图像调用 calc_gray_hist / calc_color_hist(raw=True) 相同，
+    并提供均值、标准差和百分位数等统计量。
+    """
+
+    def __init__(self, channels=1):
+        self.channels = channels
+        self.counts = np.zeros((channels, 256), np.int64)
+
+    def update(self, block):
+        """累计一块 H×W（灰度）或 H×W×C 的 uint8 图像"""
+        block = np.ascontiguousarray(block)
+        for c in range(self.channels):
+            self.counts[c] += cv2.calcHist([block], [c], None, [256], [0, 256]).ravel().astype(np.int64)
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    @property
+    def total(self):
+        return int(self.counts[0].sum())
+
+    def mean(self):
+        return self.counts @ np.arange(256) / np.maximum(self.counts.sum(axis=1), 1)
+
+    def std(self):
+        levels = np.arange(256)
+        mean = self.mean()
+        var = self.counts @ (levels * levels) / np.maximum(self.counts.sum(axis=1), 1) - mean * mean
+        return np.sqrt(np.maximum(var, 0))
+
+    def percentile(self, q):
+        """每个通道第 q 百分位所在的灰度级"""
+        cumulative = np.cumsum(self.counts, axis=1)
+        q = np.asarray(q, dtype=np.float64)
+        target = np.atleast_1d(q) / 100.0 * cumulative[:, -1:]
+        values = np.array([np.searchsorted(cumulative[c], target[c]) for c in range(self.channels)])
+        return values[:, 0] if q.ndim == 0 else values
+
+    def summary(self):
+        percentiles = (1, 5, 25, 50, 75, 95, 99)
+        values = self.percentile(percentiles)
+        return [{"mean": float(m), "std": float(sd), "min": int(np.flatnonzero(h)[0]) if h.any() else 0,
+                 "max": int(np.flatnonzero(h)[-1]) if h.any() else 0,
+                 "percentiles": dict(zip(percentiles, v.tolist()))}
+                for m, sd, h, v in zip(self.mean(), self.std(), self.counts, values)]
+
+
+# 打开原始（无压缩）像素文件为只读内存映射，不整体读入内存
+def open_raw(path, width, height, channels=1):
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    return np.memmap(path, dtype=np.uint8, mode="r", shape=shape)
+
+
+# 流式统计超大图像的直方图
+def stream_histogram(image, strip_rows=256, workers=None):
+    """按行条带统计 image（ndarray 或 np.memmap）的直方图，条带分给线程池并行累计后合并。
+
+    每个线程一次只读入一条带，内存占用与图像大小无关；单个条带不超过 2^24 像素，
+    保证 calcHist 的单精度计数是精确的。
+    """
+    rows, cols = image.shape[:2]
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    strip_rows = max(1, min(strip_rows, (1 << 24) // max(cols, 1)))
+    starts = range(0, rows, strip_rows)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(starts)))
+
+    def run(worker):
+        partial = HistogramAccumulator(channels)
+        for start in starts[worker::workers]:
+            partial.update(image[start:start + strip_rows])
+        return partial
+
+    result = HistogramAccumulator(channels)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for partial in pool.map(run, range(workers)):
+            result.merge(partial)
+    return result
+
+
+# CLAHE 对象内部带有缓冲区，不能被多个线程同时使用，因此每个线程各保留一个并反复复用
+_clahe_local = threading.local()
+
+
+def get_clahe(clip_limit=2.0, grid=(8, 8)):
+    clahe = getattr(_clahe_local, "clahe", None)
+    if clahe is None:
+        clahe = _clahe_local.clahe = cv2.createCLAHE()
+    clahe.setClipLimit(clip_limit)
+    clahe.setTilesGridSize(grid)
+    return clahe
+
+
+@register("clahe", Param("clip_limit", float, 2.0), Param("grid", size, (8, 8)), Param("workers", int, 1), label="CLAHE")
+def apply_clahe(img, clip_limit=2.0, grid=(8, 8), workers=1):
+    """应用 CLAHE 并返回结果，workers > 1 时按带重叠的水平条带并行处理"""
+    gray = derived_cache.gray(img)
+    if workers == 1 or grid[1] < 2:
+        return get_clahe(clip_limit, grid).apply(gray)
+    return tiled_clahe(gray, clip_limit, grid, workers)
+
+
+def tiled_clahe(gray, clip_limit=2.0, grid=(8, 8), workers=None):
+    """按 CLAHE 的分块行切成条带并行处理。
+
+    按 OpenCV 的规则补边：只要有一个方向不能被分块数整除，两个方向都用 BORDER_REFLECT_101
+    补 tiles - n % tiles 个像素（能整除的方向也会多出一整块），分块尺寸因此与整幅处理时相同。
+    每个条带上下各多带一行分块，使条带内像素插值所用的分块直方图与整幅处理时相同。
+    """
+    tiles_x, tiles_y = grid
+    rows, cols = gray.shape
+    padded = gray
+    if rows % tiles_y or cols % tiles_x:
+        padded = cv2.copyMakeBorder(gray, 0, tiles_y - rows % tiles_y, 0, tiles_x - cols % tiles_x,
+                                    cv2.BORDER_REFLECT_101)
+    tile_h = padded.shape[0] // tiles_y
+    workers = max(1, min(workers or os.cpu_count() or 1, tiles_y))
+    result = np.empty_like(gray)
+
+    def run(tile_rows):
+        first, last = int(tile_rows[0]), int(tile_rows[-1]) + 1
+        top, bottom = max(first - 1, 0), min(last + 1, tiles_y)
+        strip = get_clahe(clip_limit, (tiles_x, bottom - top)).apply(padded[top * tile_h:bottom * tile_h])
+        start, stop = first * tile_h, min(last * tile_h, rows)
+        result[start:stop] = strip[start - top * tile_h:stop - top * tile_h, :cols]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, np.array_split(np.arange(tiles_y), workers)))
     return result
 
 
+# 检查条带并行 CLAHE 用的尺寸：两个方向都能整除、只有一个方向能整除、都不能整除分块数
+CLAHE_CHECK_SHAPES = ((512, 512), (517, 512), (512, 517), (1001, 800), (300, 1000), (77, 64), (517, 515))
+
+
+def check_tiled_clahe(img, shapes=CLAHE_CHECK_SHAPES, workers=(2, 3, 4), tolerance=1):
+    """把 img 缩放到各种尺寸，确认条带并行结果与整幅 CLAHE 的最大差不超过 tolerance"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    for rows, cols in shapes:
+        resized = cv2.resize(gray, (cols, rows))
+        reference = get_clahe().apply(resized)
+        for n in workers:
+            diff = int(np.abs(tiled_clahe(resized, workers=n).astype(np.int16) - reference).max())
+            assert diff <= tolerance, f"{cols}x{rows} 图像 {n} 线程条带 CLAHE 与整幅结果最大差 {diff}"
+    print(f"  {len(shapes)} 种尺寸的条带 CLAHE 与整幅结果最大差都不超过 {tolerance}")
+
+
+def benchmark_clahe(img, repeat=10):
+    """比较整幅 CLAHE 与不同线程数的条带并行 CLAHE"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    check_tiled_clahe(gray)
+    reference = apply_clahe(gray)
+    baseline = None
+    print(f"图像 {gray.shape[1]}x{gray.shape[0]}，CPU 核心数 {os.cpu_count()}")
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        result = apply_clahe(gray, workers=workers)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            apply_clahe(gray, workers=workers)
+        elapsed = (time.perf_counter() - start) / repeat
+        baseline = baseline or elapsed
+        diff = int(np.abs(result.astype(np.int16) - reference).max())
+        print(f"  {workers} 线程: {elapsed * 1000:.1f} ms/次，加速比 {baseline / elapsed:.2f}，与整幅结果最大差 {diff}")
+
+
+# 频域滤波引擎
+class FrequencyFilter:
+    """频域滤波：正向频谱按图像缓存，滤波掩码按 (尺寸, 类型, 截止频率, 阶数, 高/低通) 缓存。
+
+    图像按反射方式补到 getOptimalDFTSize 给出的最优尺寸后做实数 FFT（rfft2），只保存一半频谱；
+    掩码直接在未移位的频率坐标上生成，省去 fftshift / ifftshift。截止频率以原图尺寸下距频谱中心的
+    像素数计，与补边前的含义一致。支持 square（原实现的方形掩码）、ideal、butterworth、gaussian。
+    频谱放在 cache（默认为模块共用的 derived_cache）中，以数组对象为键，原地修改已缓存的图像后需调用 forget()。
+    """
+
+    KINDS = ("square", "ideal", "butterworth", "gaussian")
+
+    def __init__(self, max_masks=16, cache=None):
+        self.max_masks = max_masks
+        self.cache = cache or derived_cache
+        self._masks = OrderedDict()
+
+    def forget(self, img=None):
+        self.cache.invalidate(img)
+
+    def spectrum(self, img):
+        """返回 (半频谱, 原图尺寸, 补边后尺寸)，彩色图像先转灰度"""
+        def compute(img):
+            gray = self.cache.float32(img)
+            rows, cols = gray.shape
+            dft_shape = (cv2.getOptimalDFTSize(rows), cv2.getOptimalDFTSize(cols))
+            padded = cv2.copyMakeBorder(gray, 0, dft_shape[0] - rows, 0, dft_shape[1] - cols, cv2.BORDER_REFLECT_101)
+            return np.fft.rfft2(padded), (rows, cols), dft_shape
+
+        return self.cache.get(img, "rfft2", compute)
+
+    def mask(self, dft_shape, image_shape, kind="gaussian", cutoff=30, highpass=False, order=2):
+        """生成（或取出缓存的）补边后尺寸为 dft_shape 的半频谱 float32 掩码"""
+        if kind not in self.KINDS:
+            raise ValueError(f"未知滤波器类型：{kind}")
+        if cutoff <= 0:
+            raise ValueError("截止频率必须为正数")
+        key = (dft_shape, image_shape, kind, cutoff, highpass, order)
+        mask = self._masks.get(key)
+        if mask is not None:
+            self._masks.move_to_end(key)
+            return mask
+
+        # 频率换算为原图尺寸下距中心的像素数（与 fftshift 后的坐标一致）
+        fy = np.abs(np.fft.fftfreq(dft_shape[0]) * image_shape[0]).astype(np.float32)[:, None]
+        fx = np.abs(np.fft.rfftfreq(dft_shape[1]) * image_shape[1]).astype(np.float32)[None, :]
+        if kind == "square":
+            mask = ((fy < cutoff) & (fx < cutoff)).astype(np.float32)
+        else:
+            dist2 = fy * fy + fx * fx
+            if kind == "ideal":
+                mask = (dist2 <= cutoff * cutoff).astype(np.float32)
+            elif kind == "butterworth":
+                mask = 1.0 / (1.0 + (dist2 / float(cutoff * cutoff)) ** order)
+            else:
+                mask = np.exp(-dist2 / (2.0 * cutoff * cutoff))
+        mask = mask.astype(np.float32)
+        if highpass:
+            mask = 1.0 - mask
+
+        self._masks[key] = mask
+        while len(self._masks) > self.max_masks:
+            self._masks.popitem(last=False)
+        return mask
+
+    def apply(self, img, kind="gaussian", cutoff=30, highpass=False, order=2):
+        """对图像做高通或低通滤波，返回归一化到 0~255 的 uint8 结果"""
+        spectrum, (rows, cols), dft_shape = self.spectrum(img)
+        mask = self.mask(dft_shape, (rows, cols), kind, cutoff, highpass, order)
+        img_back = np.fft.irfft2(spectrum * mask, s=dft_shape)[:rows, :cols]
+        img_back = np.abs(img_back)
+        return cv2.normalize(img_back, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+    def filter_stack(self, stack, kind="gaussian", cutoff=30, highpass=False, order=2, chunk_size=16,
+                     workers=None, out=None):
+        """对 N×H×W 的同尺寸灰度图像栈（可以是 np.memmap）做同一个频域滤波。
+
+        所有图像共用一个缓存的掩码；按 chunk_size 张一块读入、补边并对整块做批量 rfft2，
+        多块在线程池中并行（numpy 的 FFT 计算时会释放 GIL），内存占用只与块大小和线程数有关。
+        结果写入 out（默认新建 uint8 数组，也可以传入 np.memmap），每张图像单独归一化到 0~255。
+        """
+        count, rows, cols = stack.shape
+        dft_shape = (cv2.getOptimalDFTSize(rows), cv2.getOptimalDFTSize(cols))
+        mask = self.mask(dft_shape, (rows, cols), kind, cutoff, highpass, order)
+        if out is None:
+            out = np.empty((count, rows, cols), np.uint8)
+
+        def run(start):
+            block = np.asarray(stack[start:start + chunk_size], dtype=np.float32)
+            block = np.pad(block, ((0, 0), (0, dft_shape[0] - rows), (0, dft_shape[1] - cols)), mode="reflect")
+            spectrum = np.fft.rfft2(block)
+            spectrum *= mask
+            back = np.abs(np.fft.irfft2(spectrum, s=dft_shape)[:, :rows, :cols])
+            low = back.min(axis=(1, 2), keepdims=True)
+            span = back.max(axis=(1, 2), keepdims=True) - low
+            back -= low
+            back *= 255.0 / np.where(span > 0, span, 1.0)
+            out[start:start + len(block)] = back.astype(np.uint8)
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            list(pool.map(run, range(0, count, chunk_size)))
+        return out
+
+    def magnitude_spectrum(self, img):
+        """返回与原图同尺寸的中心化对数幅度谱（uint8）。
+
+        显示用的频谱在原尺寸上计算（补边会改变尺寸和频谱形状，只有滤波需要补边），幅度按图像缓存。
+        """
+        def compute(img):
+            dft = cv2.dft(self.cache.float32(img), flags=cv2.DFT_COMPLEX_OUTPUT)
+            # 原实现对 (H, W, 2) 整体 fftshift，顺带交换了实部和虚部；按同样的参数顺序求幅度，结果逐像素一致
+            return cv2.magnitude(dft[:, :, 1], dft[:, :, 0])
+
+        magnitude = np.fft.fftshift(self.cache.get(img, "dft_magnitude", compute))
+        magnitude_spectrum = 20 * np.log(magnitude + 1)
+        return cv2.normalize(magnitude_spectrum, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+
+frequency_filter = FrequencyFilter()  # 模块共用的滤波引擎
+
+
+@register("fourier", label="傅里叶变换")
 def fourier_transform(img):
     """傅里叶变换并返回频谱图"""
-    img_float32 = np.float32(img)
-    dft = cv2.dft(img_float32, flags=cv2.DFT_COMPLEX_OUTPUT)
-    dft_shift = np.fft.fftshift(dft)
-    magnitude_spectrum = 20 * np.log(cv2.magnitude(dft_shift[:, :, 0], dft_shift[:, :, 1]) + 1)
-    magnitude_spectrum = cv2.normalize(magnitude_spectrum, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-    return magnitude_spectrum
+    return frequency_filter.magnitude_spectrum(img)
 
 
-def low_pass_filter(img):
+@register("low_pass", Param("kind", str, "square", FrequencyFilter.KINDS), Param("cutoff", int, 30), Param("order", int, 2),
+          label="低通滤波")
+def low_pass_filter(img, kind="square", cutoff=30, order=2):
     """低通滤波并返回结果"""
-    img_float32 = np.float32(img)
-    dft = cv2.dft(img_float32, flags=cv2.DFT_COMPLEX_OUTPUT)
-    dft_shift = np.fft.fftshift(dft)
-
-    rows, cols = img.shape
-    crow, ccol = rows // 2, cols // 2
-
-    # 创建低通滤波掩码
-    mask = np.zeros((rows, cols, 2), np.uint8)
-    mask[crow - 30:crow + 30, ccol - 30:ccol + 30] = 1
-
-    # 应用掩码
-    fshift = dft_shift * mask
-    f_ishift = np.fft.ifftshift(fshift)
-    img_back = cv2.idft(f_ishift)
-    img_back = cv2.magnitude(img_back[:, :, 0], img_back[:, :, 1])
-    img_back = cv2.normalize(img_back, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-    return img_back
-
-def high_pass_filter(img):
+    return frequency_filter.apply(img, kind, cutoff, highpass=False, order=order)
+
+
+@register("high_pass", Param("kind", str, "square", FrequencyFilter.KINDS), Param("cutoff", int, 30), Param("order", int, 2),
+          label="高通滤波")
+def high_pass_filter(img, kind="square", cutoff=30, order=2):
     """高通滤波并返回结果"""
-    img_float32 = np.float32(img)
-    dft = cv2.dft(img_float32, flags=cv2.DFT_COMPLEX_OUTPUT)
-    dft_shift = np.fft.fftshift(dft)
+    return frequency_filter.apply(img, kind, cutoff, highpass=True, order=order)
 
-    rows, cols = img.shape
-    crow, ccol = rows // 2, cols // 2
 
-    # 创建高通滤波掩码
-    mask = np.ones((rows, cols, 2), np.uint8)
-    mask[crow - 30:crow + 30, ccol - 30:ccol + 30] = 0
+# 读取目录下所有同尺寸图片为灰度图像栈
+def load_stack(folder):
+    names = sorted(n for n in os.listdir(folder) if n.lower().endswith((".jpg", ".png", ".bmp")))
+    images = [cv2.imread(os.path.join(folder, n), cv2.IMREAD_GRAYSCALE) for n in names]
+    if not images or any(img is None or img.shape != images[0].shape for img in images):
+        raise ValueError("目录中没有图片，或图片无法读取 / 尺寸不一致")
+    return np.stack(images), names
 
-    # 应用掩码
-    fshift = dft_shift * mask
-    f_ishift = np.fft.ifftshift(fshift)
-    img_back = cv2.idft(f_ishift)
-    img_back = cv2.magnitude(img_back[:, :, 0], img_back[:, :, 1])
-    img_back = cv2.normalize(img_back, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-    return img_back
 
-# 显示图像到 UI
-def show_preview(image, title=""):
-    """在UI上显示图像"""
-    max_width, max_height = 400, 400
-    height, width = image.shape[:2]
+# 比较逐张滤波与批量滤波的吞吐量
+def benchmark_stack_filter(stack, kind="gaussian", cutoff=30, chunk_size=16, workers=None):
+    count = len(stack)
+    engine = FrequencyFilter()
+    start = time.perf_counter()
+    expected = [engine.apply(img, kind, cutoff) for img in stack]
+    single = count / (time.perf_counter() - start)
 
-    # 计算缩放比例
-    scale = min(max_width / width, max_height / height, 1.0)
-    new_width = int(width * scale)
-    new_height = int(height * scale)
+    start = time.perf_counter()
+    result = engine.filter_stack(stack, kind, cutoff, chunk_size=chunk_size, workers=workers)
+    batched = count / (time.perf_counter() - start)
 
-    resized_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+    error = max(int(np.abs(r.astype(np.int16) - e).max()) for r, e in zip(result, expected))
+    print(f"{count} 张 {stack.shape[2]}x{stack.shape[1]}：逐张 {single:.1f} 张/秒，批量 {batched:.1f} 张/秒，"
+          f"加速 {batched / single:.1f} 倍，最大差异 {error}")
 
-    # 转换为 RGB 或灰度模式
-    if len(resized_image.shape) == 3:  # 彩色图像
-        image_rgb = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB)
-    else:  # 灰度图像
-        image_rgb = resized_image
 
-    pil_image = Image.fromarray(image_rgb)
-    tk_image = ImageTk.PhotoImage(pil_image)
+# 显示图像到 UI
+def show_preview(image, title=""):
+    """在UI上显示图像"""
+    preview.show(image, title)
 
-    img_label.config(image=tk_image)
-    img_label.image = tk_image
-    img_label_title.config(text=title)
+
+# 界面上各操作结果的标题
+OPERATION_TITLES = {"灰度直方图": "灰度直方图", "三通道直方图": "三通道直方图", "CLAHE": "CLAHE 结果", "傅里叶变换": "傅里叶变换频谱图"}
 
 
 # Tkinter 主界面
 def main_ui():
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    from preview import ImagePreview
+
     global current_image
     current_image = None
 
@@ -189,30 +488,13 @@ def main_ui():
             return
 
         try:
-            if operation == "灰度直方图":
-                gray = cv2.cvtColor(current_image, cv2.COLOR_BGR2GRAY)
-                result = calc_gray_hist(gray)
-                show_preview(result, "灰度直方图")
-            elif operation == "三通道直方图":
-                result = calc_color_hist(current_image)
-                show_preview(result, "三通道直方图")
-            elif operation == "CLAHE":
-                result = apply_clahe(current_image)
-                show_preview(result, "CLAHE 结果")
-            elif operation == "傅里叶变换":
-                gray = cv2.cvtColor(current_image, cv2.COLOR_BGR2GRAY)
-                result = fourier_transform(gray)
-                show_preview(result, "傅里叶变换频谱图")
-            elif operation == "低通滤波":
-                gray = cv2.cvtColor(current_image, cv2.COLOR_BGR2GRAY)
-                result = low_pass_filter(gray)
-                show_preview(result, "低通滤波结果")
-            elif operation == "高通滤波":
-                gray = cv2.cvtColor(current_image, cv2.COLOR_BGR2GRAY)
-                result = high_pass_filter(gray)
-                show_preview(result, "高通滤波结果")
-            else:
-                raise ValueError("未知操作")
+            params, title = {}, OPERATION_TITLES.get(operation, f"{operation} 结果")
+            if operation in ("低通滤波", "高通滤波"):
+                params = dict(kind=filter_kind.get(), cutoff=cutoff_var.get())
+                title = f"{operation}结果（{params['kind']}，截止 {params['cutoff']}）"
+            # 灰度图、直方图和频谱都按图像缓存，同一张图反复操作时不再重新计算
+            result = run_operation(operation, current_image, **params)
+            show_preview(result, title)
         except Exception as e:
             messagebox.showerror("错误", str(e))
 
@@ -235,19 +517,93 @@ def main_ui():
     ttk.Button(button_frame, text="低通滤波", command=lambda: apply_operation("低通滤波")).pack(side=tk.LEFT, padx=5)
     ttk.Button(button_frame, text="高通滤波", command=lambda: apply_operation("高通滤波")).pack(side=tk.LEFT, padx=5)
 
+    # 频域滤波器类型与截止频率
+    filter_frame = tk.Frame(root)
+    filter_frame.pack(side=tk.TOP, padx=20, pady=5, fill=tk.X)
+    ttk.Label(filter_frame, text="滤波器类型:").pack(side=tk.LEFT, padx=5)
+    filter_kind = ttk.Combobox(filter_frame, values=list(FrequencyFilter.KINDS), state="readonly", width=12)
+    filter_kind.set("square")
+    filter_kind.pack(side=tk.LEFT, padx=5)
+    ttk.Label(filter_frame, text="截止频率:").pack(side=tk.LEFT, padx=5)
+    cutoff_var = tk.IntVar(value=30)
+    ttk.Entry(filter_frame, textvariable=cutoff_var, width=5).pack(side=tk.LEFT, padx=5)
+
     # 图片显示区域
     img_frame = tk.Frame(root, width=600, height=600, bg="gray")
     img_frame.pack(side=tk.TOP, padx=10, pady=10, fill=tk.BOTH, expand=True)
 
-    global img_label, img_label_title
+    global img_label, img_label_title, preview
     img_label = tk.Label(img_frame)
     img_label.pack(fill=tk.BOTH, expand=True)
 
     img_label_title = tk.Label(root, text="", font=("Arial", 14))
     img_label_title.pack(side=tk.BOTTOM, pady=5)
+    preview = ImagePreview(img_label, (400, 400), img_label_title)
 
     root.mainloop()
 
 
-# 启动UI
-main_ui()
+def parse_args():
+    parser = argparse.ArgumentParser(description="图像操作工具，不带参数时启动图形界面")
+    parser.add_argument("--stack", metavar="FOLDER", help="对目录下所有同尺寸图片批量做频域滤波")
+    parser.add_argument("--output", help="批量滤波结果的输出目录")
+    parser.add_argument("--kind", choices=FrequencyFilter.KINDS, default="gaussian", help="滤波器类型")
+    parser.add_argument("--cutoff", type=float, default=30, help="截止频率（像素）")
+    parser.add_argument("--highpass", action="store_true", help="高通滤波（默认低通）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="线程数，默认使用全部 CPU 核心")
+    parser.add_argument("--benchmark", action="store_true", help="比较逐张滤波与批量滤波的吞吐量")
+    parser.add_argument("--benchmark-hist", metavar="IMAGE", help="比较直方图刷新的耗时")
+    parser.add_argument("--hist-stats", metavar="PATH", help="流式统计图像的直方图、均值和百分位数")
+    parser.add_argument("--raw", metavar="WxH[xC]", help="--hist-stats 的输入为无压缩像素文件时给出尺寸与通道数")
+    parser.add_argument("--benchmark-clahe", metavar="IMAGE", help="比较整幅与条带并行 CLAHE 的耗时")
+    parser.add_argument("--strip-rows", type=int, default=256, help="流式统计时每个条带的行数")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.hist_stats:
+        if args.raw:
+            width, height, *rest = (int(v) for v in args.raw.lower().split("x"))
+            image = open_raw(args.hist_stats, width, height, rest[0] if rest else 1)
+        else:
+            image = cv2.imread(args.hist_stats, cv2.IMREAD_UNCHANGED)  # 压缩格式只能整体解码
+            if image is None:
+                raise SystemExit(f"无法读取图片：{args.hist_stats}")
+        stats = stream_histogram(image, args.strip_rows, args.workers)
+        for channel, info in enumerate(stats.summary()):
+            print(f"通道 {channel}: 均值 {info['mean']:.2f}，标准差 {info['std']:.2f}，"
+                  f"范围 [{info['min']}, {info['max']}]，百分位 {info['percentiles']}")
+    elif args.benchmark_clahe:
+        image = cv2.imread(args.benchmark_clahe, cv2.IMREAD_COLOR)
+        if image is None:
+            raise SystemExit(f"无法读取图片：{args.benchmark_clahe}")
+        benchmark_clahe(image)
+    elif args.benchmark_hist:
+        image = cv2.imread(args.benchmark_hist, cv2.IMREAD_COLOR)
+        if image is None:
+            raise SystemExit(f"无法读取图片：{args.benchmark_hist}")
+        benchmark_histogram_render(image)
+    elif args.benchmark:
+        if args.stack:
+            stack, _ = load_stack(args.stack)
+        else:
+            # 没有给出目录时用 lenna 的随机平移裁剪拼成图像栈
+            lenna = cv2.imread("examples/lenna.jpg", cv2.IMREAD_GRAYSCALE)
+            tiles = np.tile(lenna, (3, 3))
+            offsets = np.random.default_rng(0).integers(0, 256, (64, 2))
+            stack = np.stack([tiles[y:y + 480, x:x + 480] for y, x in offsets])
+        benchmark_stack_filter(stack, args.kind, args.cutoff, workers=args.workers)
+    elif args.stack:
+        stack, names = load_stack(args.stack)
+        start = time.perf_counter()
+        result = frequency_filter.filter_stack(stack, args.kind, args.cutoff, args.highpass, workers=args.workers)
+        elapsed = time.perf_counter() - start
+        print(f"共滤波 {len(names)} 张，{len(names) / elapsed:.1f} 张/秒")
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            for name, img in zip(names, result):
+                cv2.imwrite(os.path.join(args.output, name), img)
+    else:
+        # 启动UI
+        main_ui()
@@ -1,9 +1,5 @@
 import cv2
 import numpy as np
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinter import ttk
-from PIL import Image, ImageTk
 
 # Harris 角点检测
 def harris_corner_detection(img):
@@ -25,31 +21,14 @@ def sift_feature_detection(img):
 # 显示图像到 UI
 def show_preview(image, title=""):
     """在UI上显示图像"""
-    max_width, max_height = 600, 400
-    height, width = image.shape[:2]
-
-    # 计算缩放比例
-    scale = min(max_width / width, max_height / height, 1.0)
-    new_width = int(width * scale)
-    new_height = int(height * scale)
-
-    resized_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-
-    # 转换为 RGB 或灰度模式
-    if len(resized_image.shape) == 3:
-        image_rgb = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB)
-    else:
-        image_rgb = resized_image
-
-    pil_image = Image.fromarray(image_rgb)
-    tk_image = ImageTk.PhotoImage(pil_image)
-
-    img_label.config(image=tk_image)
-    img_label.image = tk_image
-    img_label_title.config(text=title)
+    preview.show(image, title)
 
 # Tkinter 主界面
 def main_ui():
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    from preview import ImagePreview
+
     global current_image
     current_image = None
 
@@ -107,14 +86,16 @@ def main_ui():
     img_frame = tk.Frame(root, width=600, height=600, bg="gray")
     img_frame.pack(side=tk.TOP, padx=10, pady=10, fill=tk.BOTH, expand=True)
 
-    global img_label, img_label_title
+    global img_label, img_label_title, preview
     img_label = tk.Label(img_frame)
     img_label.pack(fill=tk.BOTH, expand=True)
 
     img_label_title = tk.Label(root, text="", font=("Arial", 14))
     img_label_title.pack(side=tk.BOTTOM, pady=5)
+    preview = ImagePreview(img_label, (600, 400), img_label_title)
 
     root.mainloop()
 
 # 启动 UI
-main_ui()
+if __name__ == "__main__":
+    main_ui()
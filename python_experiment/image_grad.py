@@ -1,44 +1,50 @@
 import cv2
 import numpy as np
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinter import ttk
-from PIL import Image, ImageTk
+
+from operations import Param, register, run_operation
 
 # Sobel算子边缘检测
-def apply_sobel(img, combine=True):
+@register("sobel", input="gray", label="Sobel")
+def apply_sobel(img, combine=True, dst=None):
     # 使用Sobel算子检测水平和垂直边缘
     sobelx = cv2.Sobel(img, cv2.CV_64F, 1, 0, ksize=3)  # 水平方向的Sobel算子
     sobelx = cv2.convertScaleAbs(sobelx)  # 转换为绝对值，转换成8位无符号整型
     sobely = cv2.Sobel(img, cv2.CV_64F, 0, 1, ksize=3)  # 垂直方向的Sobel算子
     sobely = cv2.convertScaleAbs(sobely)  # 转换为绝对值
     if combine:  # 如果需要合并水平和垂直边缘
-        return cv2.addWeighted(sobelx, 0.5, sobely, 0.5, 0)  # 合并两个方向的边缘
+        return cv2.addWeighted(sobelx, 0.5, sobely, 0.5, 0, dst=dst)  # 合并两个方向的边缘
     else:
         return sobelx, sobely  # 返回水平和垂直边缘图像
 
 # Scharr算子边缘检测
-def apply_scharr(img):
+@register("scharr", input="gray", label="Scharr")
+def apply_scharr(img, dst=None):
     # 使用Scharr算子检测边缘
     scharrx = cv2.Scharr(img, cv2.CV_64F, 1, 0)  # 水平方向的Scharr算子
     scharry = cv2.Scharr(img, cv2.CV_64F, 0, 1)  # 垂直方向的Scharr算子
     scharrx = cv2.convertScaleAbs(scharrx)  # 转换为绝对值
     scharry = cv2.convertScaleAbs(scharry)  # 转换为绝对值
-    return cv2.addWeighted(scharrx, 0.5, scharry, 0.5, 0)  # 合并两个方向的边缘
+    return cv2.addWeighted(scharrx, 0.5, scharry, 0.5, 0, dst=dst)  # 合并两个方向的边缘
 
 # Laplacian算子边缘检测
-def apply_laplacian(img):
+@register("laplacian", input="gray", label="Laplacian")
+def apply_laplacian(img, dst=None):
     # 使用Laplacian算子检测边缘
     laplacian = cv2.Laplacian(img, cv2.CV_64F)  # 计算Laplacian
-    return cv2.convertScaleAbs(laplacian)  # 转换为绝对值并返回
+    return cv2.convertScaleAbs(laplacian, dst=dst)  # 转换为绝对值并返回
 
 # Canny边缘检测
-def apply_canny(img, threshold1, threshold2):
+@register("canny", Param("threshold1", float, 50), Param("threshold2", float, 150), input="gray", label="Canny")
+def apply_canny(img, threshold1=50, threshold2=150, dst=None):
     # 使用Canny算子进行边缘检测
-    return cv2.Canny(img, threshold1, threshold2)  # 返回边缘检测结果
+    return cv2.Canny(img, threshold1, threshold2, edges=dst)  # 返回边缘检测结果
 
 # Tkinter 主界面函数
 def main_ui():
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    from preview import ImagePreview
+
     # 全局变量定义
     global current_image, current_image_path
     current_image = None
@@ -82,15 +88,9 @@ def main_ui():
             messagebox.showwarning("警告", "请先加载图片")
             return
         try:
-            gray_image = cv2.cvtColor(current_image, cv2.COLOR_BGR2GRAY)  # 将图像转换为灰度图
-            if method == "Sobel":  # 如果选择的是Sobel操作
-                result = apply_sobel(gray_image)
-            elif method == "Scharr":  # 如果选择的是Scharr操作
-                result = apply_scharr(gray_image)
-            elif method == "Laplacian":  # 如果选择的是Laplacian操作
-                result = apply_laplacian(gray_image)
-            else:
+            if method not in ("Sobel", "Scharr", "Laplacian"):
                 raise ValueError("未知边缘检测操作")  # 抛出未知操作异常
+            result = run_operation(method, current_image)  # 注册的边缘检测操作会先取缓存的灰度图
             show_preview(result, f"{method} 操作结果")  # 显示操作结果
         except Exception as e:
             messagebox.showerror("错误", str(e))  # 弹出错误信息
@@ -105,8 +105,8 @@ def main_ui():
         try:
             threshold1 = int(canny_threshold1.get())  # 获取第一个阈值
             threshold2 = int(canny_threshold2.get())  # 获取第二个阈值
-            gray_image = cv2.cvtColor(current_image, cv2.COLOR_BGR2GRAY)  # 将图像转换为灰度图
-            result = apply_canny(gray_image, threshold1, threshold2)  # 进行Canny边缘检测
+            # 灰度图按图像缓存，反复调整阈值时不再重新转换
+            result = run_operation("canny", current_image, threshold1=threshold1, threshold2=threshold2)
             show_preview(result, f"Canny 操作结果 (阈值1: {threshold1}, 阈值2: {threshold2})")  # 显示操作结果
         except ValueError:
             messagebox.showerror("错误", "请输入有效的整数阈值")  # 如果阈值无效则弹出错误
@@ -116,25 +116,7 @@ def main_ui():
     # 显示图片预览的函数
     def show_preview(image, title=""):
         """显示图片预览"""
-        max_width, max_height = 400, 400  # 限制图片显示的最大宽度和高度
-        height, width = image.shape[:2]
-
-        # 计算缩放比例
-        scale = min(max_width / width, max_height / height, 1.0)
-        new_width = int(width * scale)  # 计算新宽度
-        new_height = int(height * scale)  # 计算新高度
-
-        # 调整图片大小以适配显示区域
-        resized_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-
-        # 转换为RGB模式并显示在Tkinter中
-        image_rgb = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB) if len(resized_image.shape) == 3 else resized_image
-        pil_image = Image.fromarray(image_rgb)  # 将OpenCV图像转换为PIL图像
-        tk_image = ImageTk.PhotoImage(pil_image)  # 将PIL图像转换为Tkinter可用格式
-
-        img_label.config(image=tk_image)  # 更新标签显示
-        img_label.image = tk_image  # 保持对图像的引用，防止被垃圾回收
-        img_label_title.config(text=title)  # 更新图像标题
+        preview.show(image, title)
 
     # 主窗口布局设置
     root = tk.Tk()
@@ -181,9 +163,11 @@ def main_ui():
 
     img_label_title = tk.Label(root, text="", font=("Arial", 14))  # 创建标题标签
     img_label_title.pack(side=tk.BOTTOM, pady=5)  # 显示在底部
+    preview = ImagePreview(img_label, (400, 400), img_label_title)
 
     root.mainloop()  # 启动主循环
 
 
 # 启动UI
-main_ui()  # 调用主UI函数来启动应用程序
+if __name__ == "__main__":
+    main_ui()  # 调用主UI函数来启动应用程序
@@ -1,18 +1,451 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
 import cv2
 import numpy as np
-from PIL import Image, ImageTk
+
+
+def file_hash(source):
+    """图片文件按内容计算哈希，内存中的图像按像素计算，作为特征缓存的键"""
+    digest = hashlib.sha1()
+    if isinstance(source, np.ndarray):
+        digest.update(str(source.shape).encode())
+        digest.update(np.ascontiguousarray(source).data)
+    else:
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """按文件哈希和检测尺度缓存 SIFT 特征点坐标和描述符，最近最少使用的条目先被淘汰。
+
+    给出 cache_dir 时同时以 npz 文件保存到磁盘，下次启动也能复用。
+    """
+
+    def __init__(self, max_entries=64, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._sift = None
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key[0]}_{key[1]:g}.npz")
+
+    def get(self, key, image, scale=1.0):
+        """返回 image 的 (特征点坐标 N×2, 描述符 N×128)。
+
+        scale < 1 时在缩小的图像上检测，坐标换算回原图，因此单应矩阵总是原图分辨率下的。
+        image 也可以是返回图像的函数，只在缓存未命中时才调用。
+        """
+        key = (key, scale)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self.cache_dir and os.path.exists(self._path(key)):
+            with np.load(self._path(key)) as data:
+                features = data["points"], data["descriptors"]
+        else:
+            features = self.compute(image() if callable(image) else image, scale)
+            if self.cache_dir:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.savez(self._path(key), points=features[0], descriptors=features[1])
+        self._entries[key] = features
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return features
+
+    def compute(self, image, scale=1.0):
+        if self._sift is None:
+            self._sift = cv2.SIFT_create()
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        if scale != 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        kp, des = self._sift.detectAndCompute(gray, None)
+        points = np.array([k.pt for k in kp], dtype=np.float32).reshape(-1, 2) / scale
+        if des is None:
+            des = np.zeros((0, 128), np.float32)
+        return points, des
+
+
+feature_cache = FeatureCache()
+
+
+@lru_cache(maxsize=2)
+def feather_weight(shape):
+    """越靠近图像中心权重越大，用于重叠区域的羽化融合（同尺寸的图片共用一张只读权重图）"""
+    h, w = shape[:2]
+    ys = np.minimum(np.arange(h), np.arange(h)[::-1]).astype(np.float32) + 1
+    xs = np.minimum(np.arange(w), np.arange(w)[::-1]).astype(np.float32) + 1
+    weight = np.minimum.outer(ys, xs)
+    weight.flags.writeable = False
+    return weight
+
+
+def inverse_maps(transform, x0, y0, x1, y1):
+    """画布上 [x0, x1)×[y0, y1) 区域各像素在原图中的坐标，转换为 cv2.remap 使用的定点映射表。
+
+    坐标直接由完整单应矩阵的逆矩阵按画布绝对坐标计算，与区域怎样划分无关，
+    因此分块变换与整幅变换的结果逐像素一致（对平移后的矩阵做 warpPerspective 时，
+    舍入误差随分块位置变化，插值结果会差 1 个灰度级，图片边缘的有效像素也会不同）。
+    """
+    inverse = np.linalg.inv(transform)
+    xs = np.arange(x0, x1, dtype=np.float64)[None, :]
+    ys = np.arange(y0, y1, dtype=np.float64)[:, None]
+    w = inverse[2, 0] * xs + inverse[2, 1] * ys + inverse[2, 2]
+    map_x = ((inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2]) / w).astype(np.float32)
+    map_y = ((inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2]) / w).astype(np.float32)
+    return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+
+class TileWriter:
+    """把分块逐行写进磁盘上的 .npy 文件，不做内存映射，写过的数据不会留在进程内存里"""
+
+    def __init__(self, path, shape, dtype=np.uint8):
+        header = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)  # 只用来写文件头并分配文件
+        self.offset, self.shape, self.itemsize = header.offset, shape, header.itemsize
+        del header
+        self.path = path
+        self._file = open(path, "r+b")
+
+    def write(self, y, x, block):
+        row_bytes = int(np.prod(self.shape[1:])) * self.itemsize
+        pixel_bytes = row_bytes // self.shape[1]
+        block = np.ascontiguousarray(block)
+        for r in range(block.shape[0]):
+            self._file.seek(self.offset + (y + r) * row_bytes + x * pixel_bytes)
+            self._file.write(block[r].tobytes())
+
+    def close(self):
+        self._file.close()
+
+
+class StitchingEngine:
+    """按顺序拼接 N 张图片的全景拼接引擎。
+
+    每张图片只与前一张做特征匹配，单应矩阵逐对估计后累乘到第一张图的坐标系，
+    因此追加一张图片只需要计算这一张的特征和一次匹配，之前的结果都保留。
+    work_scale < 1 时特征检测、匹配和曝光补偿都在缩小的副本上进行，
+    只有最后的变换和融合使用原图，输出分辨率不变。
+    keep_images=False 时以路径加入的图片只保留路径，需要时再读取，最多同时缓存 max_loaded 张。
+    """
+
+    def __init__(self, cache=None, ratio=0.75, min_matches=10, reproj_threshold=4.0, work_scale=1.0,
+                 exposure=True, keep_images=True, max_loaded=3):
+        self.cache = cache or feature_cache
+        self.work_scale = work_scale
+        self.exposure = exposure
+        self.keep_images = keep_images
+        self.max_loaded = max_loaded
+        self.ratio = ratio
+        self.min_matches = min_matches
+        self.reproj_threshold = reproj_threshold
+        self.sources = []  # 图像数组，或 keep_images=False 时的文件路径
+        self.shapes = []
+        self.keys = []
+        self.homographies = []  # 每张图到第一张图坐标系的单应矩阵
+        self._loaded = OrderedDict()
+        self._matcher = cv2.FlannBasedMatcher(dict(algorithm=1, trees=5), dict(checks=50))
+
+    def __len__(self):
+        return len(self.sources)
+
+    def clear(self):
+        self.sources, self.shapes, self.keys, self.homographies = [], [], [], []
+        self._loaded.clear()
+
+    def image(self, index):
+        """取第 index 张图片，按路径保存的图片读取后缓存最近用到的几张"""
+        source = self.sources[index]
+        if isinstance(source, np.ndarray):
+            return source
+        if source not in self._loaded:
+            self._loaded[source] = cv2.imread(source)
+            if len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        self._loaded.move_to_end(source)
+        return self._loaded[source]
+
+    def add(self, source):
+        """追加一张图片（文件路径或 BGR 图像），返回它到第一张图坐标系的单应矩阵"""
+        image = source if isinstance(source, np.ndarray) else cv2.imread(source)
+        if image is None:
+            raise ValueError(f"无法读取图片：{source}")
+        key = file_hash(source)
+        if not self.sources:
+            homography = np.eye(3)
+        else:
+            pair = self.match_pair(self.keys[-1], lambda: self.image(-1), key, image)
+            homography = self.homographies[-1] @ pair
+        self.sources.append(image if self.keep_images or isinstance(source, np.ndarray) else source)
+        self.shapes.append(image.shape)
+        self.keys.append(key)
+        self.homographies.append(homography)
+        return homography
+
+    def match_pair(self, prev_key, prev_image, key, image):
+        """估计把 image 映射到前一张图片坐标的单应矩阵"""
+        prev_points, prev_des = self.cache.get(prev_key, prev_image, self.work_scale)
+        points, des = self.cache.get(key, image, self.work_scale)
+        if len(des) < 2 or len(prev_des) < 2:
+            raise ValueError(f"第 {len(self) + 1} 张图片特征点不足")
+        good = [m for m, n in (p for p in self._matcher.knnMatch(des, prev_des, k=2) if len(p) == 2)
+                if m.distance < self.ratio * n.distance]
+        if len(good) < self.min_matches:
+            raise ValueError(f"第 {len(self) + 1} 张图片与前一张的匹配点不足（{len(good)} 个）")
+        src = points[[m.queryIdx for m in good]]
+        dst = prev_points[[m.trainIdx for m in good]]
+        # 坐标已换算到原图，RANSAC 阈值也按原图像素放大
+        homography, inliers = cv2.findHomography(src, dst, cv2.RANSAC, self.reproj_threshold / self.work_scale)
+        if homography is None or int(inliers.sum()) < self.min_matches:
+            raise ValueError(f"第 {len(self) + 1} 张图片无法与前一张对齐")
+        return homography
+
+    def transforms(self):
+        """以中间一张图片为参考平面，减小两端图片的透视拉伸，返回 (各图变换, 画布尺寸)"""
+        reference = np.linalg.inv(self.homographies[len(self.homographies) // 2])
+        transforms = [reference @ h for h in self.homographies]
+        corners = np.concatenate([
+            cv2.perspectiveTransform(np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2), t)
+            for t, (h, w) in zip(transforms, (shape[:2] for shape in self.shapes))])
+        x_min, y_min = np.floor(corners.min(axis=(0, 1))).astype(int)
+        x_max, y_max = np.ceil(corners.max(axis=(0, 1))).astype(int)
+        shift = np.array([[1, 0, -x_min], [0, 1, -y_min], [0, 0, 1]], dtype=np.float64)
+        return [shift @ t for t in transforms], (int(x_max - x_min), int(y_max - y_min))
+
+    def exposure_gains(self, transforms, size, max_pixels=500000):
+        """在缩小的画布上统计两两重叠区域的平均亮度，用与 OpenCV GainCompensator 相同的最小二乘求每张图的增益"""
+        scale = min(self.work_scale, np.sqrt(max_pixels / (size[0] * size[1])), 1.0)
+        shrink = np.diag([scale, scale, 1.0])
+        small_size = (max(1, int(size[0] * scale)), max(1, int(size[1] * scale)))
+        grays, masks = [], []
+        for index, transform in enumerate(transforms):
+            small = cv2.resize(self.image(index), None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            # 小图自身的缩放矩阵 diag(scale) 抵消后，小图到小画布的变换为 shrink·T·shrink⁻¹
+            local = shrink @ transform @ np.diag([1 / scale, 1 / scale, 1.0])
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            grays.append(cv2.warpPerspective(gray, local, small_size).astype(np.float32))
+            masks.append(cv2.warpPerspective(np.full(gray.shape, 255, np.uint8), local, small_size,
+                                             flags=cv2.INTER_NEAREST) > 0)
+        n = len(self)
+        alpha, beta = 0.01, 100.0  # 1/σN², 1/σg²，取 OpenCV 的默认值
+        A, b = np.zeros((n, n)), np.zeros(n)
+        for i in range(n):
+            for j in range(n):
+                overlap = masks[i] & masks[j]
+                count = int(overlap.sum())
+                if count == 0:
+                    continue
+                b[i] += beta * count
+                A[i, i] += beta * count
+                if i != j:
+                    mean_i, mean_j = grays[i][overlap].mean(), grays[j][overlap].mean()
+                    A[i, i] += 2 * alpha * mean_i * mean_i * count
+                    A[i, j] -= 2 * alpha * mean_i * mean_j * count
+        return np.linalg.solve(A, b)
+
+    def composite(self, tile=None, path=None):
+        """把所有图片变换到同一画布上羽化融合，返回 (全景图, 有效像素掩码)。
+
+        tile 给出时按 tile×tile 的输出分块逐块变换、融合，浮点缓冲只有一个分块大；
+        path 给出时分块直接写进磁盘上的 .npy 文件（掩码写到 *_mask.npy），返回两个文件的路径，
+        此时峰值内存只与分块大小和单张原图大小有关，与全景图大小无关。
+        """
+        if len(self) < 2:
+            raise ValueError("至少需要两张图片")
+        transforms, (width, height) = self.transforms()
+        if width * height > 20 * sum(shape[0] * shape[1] for shape in self.shapes):
+            raise ValueError("单应矩阵退化，拼接结果尺寸异常")
+        gains = self.exposure_gains(transforms, (width, height)) if self.exposure else np.ones(len(self))
+        boxes = []
+        for shape, transform in zip(self.shapes, transforms):
+            h, w = shape[:2]
+            corners = cv2.perspectiveTransform(np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2), transform)
+            x0, y0 = np.maximum(np.floor(corners.min(axis=(0, 1))).astype(int), 0)
+            x1, y1 = np.minimum(np.ceil(corners.max(axis=(0, 1))).astype(int), (width, height))
+            boxes.append((x0, y0, x1, y1))
+
+        if path:
+            mask_path = os.path.splitext(path)[0] + "_mask.npy"
+            pano, mask = TileWriter(path, (height, width, 3)), TileWriter(mask_path, (height, width))
+        else:
+            pano, mask = np.empty((height, width, 3), np.uint8), np.empty((height, width), np.uint8)
+        tile_w, tile_h = (tile, tile) if tile else (width, height)
+        origins = [(x, y) for y in range(0, height, tile_h) for x in range(0, width, tile_w)]
+        if width > height:
+            origins.sort()  # 横向长条按列推进，相邻分块用到的是同几张原图，减少重复读取
+        for x, y in origins:
+            block, valid = self._render_tile(x, y, min(tile_w, width - x), min(tile_h, height - y),
+                                             transforms, gains, boxes)
+            if path:
+                pano.write(y, x, block)
+                mask.write(y, x, valid)
+            else:
+                pano[y:y + block.shape[0], x:x + block.shape[1]] = block
+                mask[y:y + block.shape[0], x:x + block.shape[1]] = valid
+        if path:
+            pano.close()
+            mask.close()
+            return path, mask_path
+        return pano, mask
+
+    def _render_tile(self, tile_x, tile_y, width, height, transforms, gains, boxes):
+        acc = np.zeros((height, width, 3), np.float32)
+        weight_sum = np.zeros((height, width), np.float32)
+        for index, (transform, gain, box) in enumerate(zip(transforms, gains, boxes)):
+            # 只在该图片外接矩形与分块的交集内做透视变换
+            x0, y0 = max(box[0], tile_x), max(box[1], tile_y)
+            x1, y1 = min(box[2], tile_x + width), min(box[3], tile_y + height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            image = self.image(index)
+            map1, map2 = inverse_maps(transform, x0, y0, x1, y1)
+            # 边缘复制取值，避免双线性插值把画布外的黑色混进图片边缘
+            warped = cv2.remap(image, map1, map2, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE).astype(np.float32)
+            weight = cv2.remap(feather_weight(image.shape), map1, map2, cv2.INTER_LINEAR)
+            rows, cols = slice(y0 - tile_y, y1 - tile_y), slice(x0 - tile_x, x1 - tile_x)
+            acc[rows, cols] += warped * (weight * gain)[..., None]
+            weight_sum[rows, cols] += weight
+        valid = (weight_sum > 0).astype(np.uint8) * 255
+        acc /= np.maximum(weight_sum, 1e-6)[..., None]
+        return np.clip(acc, 0, 255).astype(np.uint8), valid
+
+
+def largest_rectangle(valid):
+    """valid 为布尔矩阵。逐行累计每列向上连续有效的长度，再用单调栈求柱状图中最大矩形，
+    一遍扫描得到面积最大的全有效轴对齐矩形 (x, y, w, h)"""
+    rows, cols = valid.shape
+    heights = np.zeros(cols + 1, np.int64)  # 末尾多一个 0 作为哨兵，保证每行结束时栈被清空
+    best, best_area = (0, 0, 0, 0), 0
+    for y in range(rows):
+        heights[:cols] = np.where(valid[y], heights[:cols] + 1, 0)
+        stack = []
+        for x, h in enumerate(heights.tolist()):
+            start = x
+            while stack and stack[-1][1] >= h:
+                start, top = stack.pop()
+                if top * (x - start) > best_area:
+                    best_area = top * (x - start)
+                    best = (start, y - top + 1, x - start, top)
+            stack.append((start, h))
+    return best
+
+
+def block_all(mask, factor):
+    """把 mask 按 factor×factor 分块缩小，只有整块都有效时缩小后的像素才有效（按行条带处理，支持内存映射）"""
+    rows, cols = mask.shape
+    out_rows, out_cols = rows // factor, cols // factor
+    small = np.zeros((out_rows, out_cols), bool)
+    for i in range(out_rows):
+        block = mask[i * factor:(i + 1) * factor, :out_cols * factor] > 0
+        small[i] = block.reshape(factor, out_cols, factor).all(axis=(0, 2))
+    return small
+
+
+def inscribed_rect(mask, max_cells=60000):
+    """求 mask 中面积（近似）最大的全有效矩形 (x, y, w, h)。
+
+    大图先分块缩小到约 max_cells 个格子求精确解，再回到原分辨率把四条边向外扩展到不能再扩为止。
+    """
+    rows, cols = mask.shape
+    factor = max(1, int(np.ceil(np.sqrt(rows * cols / max_cells))))
+    while True:
+        bx, by, bw, bh = largest_rectangle(block_all(mask, factor))
+        if bw and bh or factor == 1:
+            break
+        factor = max(1, factor // 2)  # 有效区域太细时降低缩小倍数
+    x, y, w, h = bx * factor, by * factor, bw * factor, bh * factor
+    if not (w and h):
+        return 0, 0, 0, 0
+    changed = True
+    while changed:
+        changed = False
+        while y > 0 and mask[y - 1, x:x + w].all():
+            y, h, changed = y - 1, h + 1, True
+        while y + h < rows and mask[y + h, x:x + w].all():
+            h, changed = h + 1, True
+        while x > 0 and mask[y:y + h, x - 1].all():
+            x, w, changed = x - 1, w + 1, True
+        while x + w < cols and mask[y:y + h, x + w].all():
+            w, changed = w + 1, True
+    return x, y, w, h
+
+
+def valid_mask(pano):
+    gray = cv2.cvtColor(pano, cv2.COLOR_BGR2GRAY)
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY)[1]
+
+
+def crop_black_border(pano, mask=None):
+    """裁掉拼接结果的黑边：直接取有效区域内的最大内接矩形"""
+    x, y, w, h = inscribed_rect(valid_mask(pano) if mask is None else mask)
+    return pano[y:y + h, x:x + w]
+
+
+def crop_black_border_erosion(pano):
+    """原来的裁剪方式：不断腐蚀外接矩形，直到矩形内不再含有无效像素，仅用于对比"""
+    stitched = cv2.copyMakeBorder(pano, 10, 10, 10, 10, cv2.BORDER_CONSTANT, (0, 0, 0))
+    thresh = valid_mask(stitched)
+    cnts = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+
+    mask = np.zeros(thresh.shape, dtype="uint8")
+    (x, y, w, h) = cv2.boundingRect(cnts[0])
+    cv2.rectangle(mask, (x, y), (x + w, y + h), 255, -1)
+    minRect = mask.copy()
+    sub = mask.copy()
+
+    while cv2.countNonZero(sub) > 0:
+        minRect = cv2.erode(minRect, None)
+        sub = cv2.subtract(minRect, thresh)
+
+    cnts = cv2.findContours(minRect, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+    (x, y, w, h) = cv2.boundingRect(cnts[0])
+    return stitched[y:y + h, x:x + w]
+
+
+def benchmark_crop(image, scales=(1, 2, 4, 8)):
+    """把图片放大并做透视变换模拟拼接结果的黑边，比较腐蚀裁剪与内接矩形裁剪"""
+    for scale in scales:
+        img = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+        h, w = img.shape[:2]
+        src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+        dst = np.float32([[0.02 * w, 0.08 * h], [0.97 * w, 0], [w, 0.95 * h], [0, h]]) + np.float32([0.02 * w, 0.03 * h])
+        pano = cv2.warpPerspective(img, cv2.getPerspectiveTransform(src, dst), (int(w * 1.05), int(h * 1.06)))
+        print(f"拼接结果 {pano.shape[1]}x{pano.shape[0]}：")
+        for name, fn in (("逐像素腐蚀", crop_black_border_erosion), ("最大内接矩形", crop_black_border)):
+            start = time.perf_counter()
+            cropped = fn(pano)
+            elapsed = time.perf_counter() - start
+            clean = cv2.countNonZero(valid_mask(cropped)) == cropped.shape[0] * cropped.shape[1]
+            print(f"  {name}: {elapsed * 1000:.1f} ms，裁剪后 {cropped.shape[1]}x{cropped.shape[0]}"
+                  f"（面积 {cropped.shape[0] * cropped.shape[1]}，{'无' if clean else '仍有'}黑边）")
+
+
+def import_ui():
+    """Tk 和预览组件只在打开拼接界面时导入，命令行拼接和基准测试不需要图形环境"""
+    global tk, ttk, filedialog, messagebox, ImagePreview
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    from preview import ImagePreview
 
 
 class PanoramaApp:
     def __init__(self, root):
+        import_ui()
         self.root = root
         self.root.title("全景拼接工具")
         self.root.geometry("1000x800")
         self.image_left = None
         self.image_right = None
-        self.ratio = 2  # 缩放比例
+        self.ratio = 2  # 缩放比例：特征匹配和曝光补偿在 1/ratio 大小的副本上进行
+        self.engine = StitchingEngine(work_scale=1 / self.ratio)
 
         # 界面布局
         self.create_widgets()
@@ -25,6 +458,7 @@ class PanoramaApp:
         ttk.Style().configure("TButton", font=("Arial", 12))
         ttk.Button(button_frame, text="打开左图", command=self.load_left_image).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="打开右图", command=self.load_right_image).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="追加图片", command=self.append_images).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="拼接图片", command=self.stitch_images).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="保存拼接结果", command=self.save_image).pack(side=tk.LEFT, padx=5)
 
@@ -41,11 +475,15 @@ class PanoramaApp:
         self.result_label = tk.Label(self.img_frame, text="拼接结果", bg="white", relief="solid")
         self.result_label.place(x=300, y=500, width=400, height=200)
 
+        self.previews = {label: ImagePreview(label, (400, 400))
+                         for label in (self.left_label, self.right_label, self.result_label)}
+
     def load_left_image(self):
         file_path = filedialog.askopenfilename(title="选择左图", filetypes=[("Image Files", "*.jpg *.png *.bmp")])
         if file_path:
             self.image_left = cv2.imread(file_path)
             self.display_image(self.image_left, self.left_label)
+            self.reset_engine()
         else:
             messagebox.showwarning("警告", "未选择任何图片！")
 
@@ -54,41 +492,52 @@ class PanoramaApp:
         if file_path:
             self.image_right = cv2.imread(file_path)
             self.display_image(self.image_right, self.right_label)
+            self.reset_engine()
         else:
             messagebox.showwarning("警告", "未选择任何图片！")
 
-    def stitch_images(self):
+    def reset_engine(self):
+        """左右图变化后重新从左图开始；特征缓存是全局的，不会重复计算"""
+        self.engine.clear()
+        for image in (self.image_left, self.image_right):
+            if image is not None:
+                try:
+                    self.engine.add(image)
+                except ValueError as e:
+                    messagebox.showerror("错误", str(e))
+                    return
+
+    def append_images(self):
+        """按顺序追加更多图片到右侧，只计算新图片的特征和与前一张的匹配"""
         if self.image_left is None or self.image_right is None:
             messagebox.showwarning("警告", "请先加载两张图片！")
             return
+        file_paths = filedialog.askopenfilenames(title="选择要追加的图片", filetypes=[("Image Files", "*.jpg *.png *.bmp")])
+        for file_path in file_paths:
+            try:
+                self.engine.add(file_path)
+            except ValueError as e:
+                messagebox.showerror("错误", str(e))
+                break
+            self.image_right = self.engine.image(-1)
+            self.display_image(self.image_right, self.right_label)
 
-        stitcher = cv2.Stitcher_create(cv2.Stitcher_PANORAMA)
-        status, pano = stitcher.stitch([self.image_left, self.image_right])
-
-        if status == cv2.Stitcher_OK:
-            # 黑边裁剪处理
-            stitched = cv2.copyMakeBorder(pano, 10, 10, 10, 10, cv2.BORDER_CONSTANT, (0, 0, 0))
-            gray = cv2.cvtColor(stitched, cv2.COLOR_BGR2GRAY)
-            thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY)[1]
-            cnts = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
-
-            mask = np.zeros(thresh.shape, dtype="uint8")
-            (x, y, w, h) = cv2.boundingRect(cnts[0])
-            cv2.rectangle(mask, (x, y), (x + w, y + h), 255, -1)
-            minRect = mask.copy()
-            sub = mask.copy()
-
-            while cv2.countNonZero(sub) > 0:
-                minRect = cv2.erode(minRect, None)
-                sub = cv2.subtract(minRect, thresh)
-
-            cnts = cv2.findContours(minRect, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
-            (x, y, w, h) = cv2.boundingRect(cnts[0])
-            self.panoramic_image = stitched[y:y + h, x:x + w]
-
-            self.display_image(self.panoramic_image, self.result_label)
-        else:
+    def stitch_images(self):
+        if self.image_left is None or self.image_right is None:
+            messagebox.showwarning("警告", "请先加载两张图片！")
+            return
+        if len(self.engine) < 2:
             messagebox.showerror("错误", "拼接失败，可能是特征点不足！")
+            return
+
+        try:
+            pano, mask = self.engine.composite()
+        except ValueError as e:
+            messagebox.showerror("错误", f"拼接失败：{e}")
+            return
+        # 黑边裁剪处理
+        self.panoramic_image = crop_black_border(pano, mask)
+        self.display_image(self.panoramic_image, self.result_label)
 
     def save_image(self):
         if hasattr(self, 'panoramic_image') and self.panoramic_image is not None:
@@ -101,19 +550,131 @@ class PanoramaApp:
             messagebox.showwarning("警告", "没有拼接结果可保存！")
 
     def display_image(self, image, label):
-        max_width, max_height = 400, 400
-        height, width = image.shape[:2]
-        scale = min(max_width / width, max_height / height, 1.0)
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        resized_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-        image_rgb = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(image_rgb)
-        img_tk = ImageTk.PhotoImage(img)
-        label.config(image=img_tk)
-        label.image = img_tk
-
-
-root = tk.Tk()
-app = PanoramaApp(root)
-root.mainloop()
+        self.previews[label].show(image)
+
+
+def crop_npy(canvas_path, mask_path, output, strip_rows=256):
+    """对写在磁盘上的拼接结果求最大内接矩形，按行条带复制到 output（.npy），返回裁剪矩形"""
+    mask = np.load(mask_path, mmap_mode="r")
+    x, y, w, h = inscribed_rect(mask)
+    del mask
+    writer = TileWriter(output, (h, w, 3))
+    for start in range(0, h, strip_rows):
+        canvas = np.load(canvas_path, mmap_mode="r")  # 每个条带重新映射，读过的页随映射一起释放
+        writer.write(start, 0, canvas[y + start:y + min(start + strip_rows, h), x:x + w])
+        del canvas
+    writer.close()
+    return x, y, w, h
+
+
+def _stitch_peak(paths, ratio=1, tile=None, path=None):
+    """在子进程中拼接一次，返回 (配准耗时, 总耗时, 进程峰值内存, 融合阶段峰值内存, 输出尺寸)，内存单位为字节"""
+    import tracemalloc
+
+    start = time.perf_counter()
+    engine = StitchingEngine(cache=FeatureCache(), work_scale=1 / ratio, keep_images=path is None)
+    for source in paths:
+        engine.add(source)
+    registered = time.perf_counter()
+    tracemalloc.start()  # 只统计融合阶段 numpy/OpenCV 数组的分配
+    pano, _ = engine.composite(tile, path)
+    composite_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    if path:
+        pano = np.load(path, mmap_mode="r")
+    elapsed = time.perf_counter() - start
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux 下单位为 KB
+    except ImportError:  # Windows 没有 resource 模块
+        peak = 0
+    return registered - start, elapsed, peak, composite_peak, pano.shape[1::-1]
+
+
+def benchmark_work_scale(paths, ratios=(1, 2, 4)):
+    """比较不同工作尺度下的拼接耗时与进程峰值内存，每种尺度在新的子进程中运行"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    megapixels = sum(np.prod(cv2.imread(path).shape[:2]) for path in paths) / 1e6
+    print(f"{len(paths)} 张图片，共 {megapixels:.1f} 百万像素")
+    for ratio in ratios:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            try:
+                register, elapsed, peak, _, size = pool.submit(_stitch_peak, paths, ratio).result()
+            except ValueError as e:
+                print(f"  ratio={ratio}: 失败，{e}")
+                continue
+        memory = f"，峰值内存 {peak / 2 ** 20:.0f} MB" if peak else ""
+        print(f"  ratio={ratio}: 配准 {register:.2f} s，总计 {elapsed:.2f} s{memory}，输出 {size[0]}x{size[1]}")
+
+
+def benchmark_tiles(paths, ratio=2, tile=1024):
+    """比较整幅内存拼接与分块写盘拼接的耗时和进程峰值内存，分块结果写在临时目录中，结束后删除"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    folder = tempfile.mkdtemp(prefix="stitch_tiles_")
+    path = os.path.join(folder, "panorama.npy")
+    for name, options in (("整幅内存", (None, None)), (f"{tile}px 分块写盘", (tile, path))):
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            _, elapsed, peak, composite_peak, size = pool.submit(_stitch_peak, paths, ratio, *options).result()
+        memory = f"，进程峰值内存 {peak / 2 ** 20:.0f} MB" if peak else ""
+        print(f"  {name}: {elapsed:.2f} s{memory}，融合阶段峰值 {composite_peak / 2 ** 20:.0f} MB，"
+              f"输出 {size[0]}x{size[1]}")
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="全景拼接工具，不带参数时启动图形界面")
+    parser.add_argument("images", nargs="*", help="按从左到右顺序给出的图片")
+    parser.add_argument("-o", "--output",
+                        help="拼接结果保存路径（给出图片时必填）；以 .npy 结尾时分块写盘，不在内存中生成整幅全景图")
+    parser.add_argument("--cache-dir", help="把特征点和描述符缓存到该目录")
+    parser.add_argument("--ratio", type=float, default=1, help="特征匹配在 1/ratio 大小的副本上进行，输出分辨率不变")
+    parser.add_argument("--tile", type=int, default=1024, help="分块写盘时每个输出分块的边长（像素）")
+    parser.add_argument("--benchmark-scale", action="store_true", help="比较 ratio=1/2/4 时的拼接耗时和峰值内存")
+    parser.add_argument("--benchmark-tiles", action="store_true", help="比较整幅拼接与分块写盘拼接的峰值内存")
+    parser.add_argument("--benchmark-crop", nargs="?", const="save/panorama.jpg", metavar="IMAGE",
+                        help="比较两种黑边裁剪方式，默认使用 save/panorama.jpg")
+    args = parser.parse_args()
+    if args.images and not (args.output or args.benchmark_scale or args.benchmark_tiles):
+        parser.error("拼接图片时需要用 -o 指定输出路径")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.benchmark_crop:
+        image = cv2.imread(args.benchmark_crop)
+        if image is None:
+            raise SystemExit(f"无法读取图片：{args.benchmark_crop}")
+        benchmark_crop(image)
+    elif args.benchmark_scale:
+        benchmark_work_scale(args.images)
+    elif args.benchmark_tiles:
+        benchmark_tiles(args.images, args.ratio, args.tile)
+    elif args.images:
+        if args.cache_dir:
+            feature_cache.cache_dir = args.cache_dir
+        out_of_core = args.output.lower().endswith(".npy")
+        engine = StitchingEngine(work_scale=1 / args.ratio, keep_images=not out_of_core)
+        start = time.perf_counter()
+        for path in args.images:
+            engine.add(path)
+        if out_of_core:
+            # 先把整幅画布分块写到临时文件，再裁剪复制到输出文件
+            canvas_path = os.path.splitext(args.output)[0] + "_canvas.npy"
+            canvas_path, mask_path = engine.composite(args.tile, canvas_path)
+            x, y, w, h = crop_npy(canvas_path, mask_path, args.output)
+            os.remove(canvas_path)
+            os.remove(mask_path)
+        else:
+            pano, mask = engine.composite()
+            result = crop_black_border(pano, mask)
+            h, w = result.shape[:2]
+            cv2.imwrite(args.output, result)
+        print(f"拼接 {len(engine)} 张图片，耗时 {time.perf_counter() - start:.2f} s，结果尺寸 {w}x{h}")
+    else:
+        import_ui()
+        root = tk.Tk()
+        app = PanoramaApp(root)
+        root.mainloop()
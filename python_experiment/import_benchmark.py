@@ -0,0 +1,70 @@
+"""统计各实验模块的导入耗时与工作进程启动延迟
+
+每个模块在全新的解释器中导入若干次取中位数，同时检查导入后是否加载了 tkinter / PIL / imutils。
+再用 spawn 方式启动进程池，测量从创建进程池到工作进程导入模块并返回结果的延迟。
+"""
+import argparse
+import json
+import multiprocessing
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+MODULES = ("AnswerCard", "Mathematical_morphology", "Template_matching", "Threshold_and_Smoothing",
+           "background_model", "basic", "image_change", "image_feature", "image_grad", "image_splicing")
+GUI_MODULES = ("tkinter", "PIL", "imutils")
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [m for m in {gui!r} if m in sys.modules]]))
+"""
+
+
+def probe(imports, repeat=5):
+    """在新的解释器中执行 imports，返回 (导入耗时中位数, 导入后已加载的界面库)"""
+    timings, loaded = [], []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", _PROBE.format(imports=imports, gui=GUI_MODULES)],
+                                capture_output=True, text=True, check=True).stdout
+        elapsed, loaded = json.loads(output.strip().splitlines()[-1])
+        timings.append(elapsed)
+    return statistics.median(timings), loaded
+
+
+def _import_in_worker(module):
+    start = time.perf_counter()
+    __import__(module)
+    return time.perf_counter() - start
+
+
+def spawn_latency(module):
+    """spawn 方式新建进程池，提交一个导入 module 的任务，返回 (总延迟, 其中导入耗时)"""
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        imported = pool.submit(_import_in_worker, module).result()
+    return time.perf_counter() - start, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计各模块的导入耗时与工作进程启动延迟")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="要测试的模块，默认全部")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="每个模块重复导入的次数")
+    args = parser.parse_args()
+
+    floor, _ = probe("import cv2, numpy", args.repeat)
+    gui, _ = probe("import tkinter, tkinter.ttk, PIL.Image, PIL.ImageTk, imutils", args.repeat)
+    print(f"基准：cv2 + numpy {floor * 1000:.0f} ms，界面库 tkinter/PIL/imutils {gui * 1000:.0f} ms")
+    for module in args.modules:
+        elapsed, loaded = probe(f"import {module}", args.repeat)
+        latency, imported = spawn_latency(module)
+        print(f"  {module:<24} 导入 {elapsed * 1000:6.0f} ms，工作进程启动 {latency * 1000:6.0f} ms"
+              f"（其中导入 {imported * 1000:.0f} ms），加载的界面库：{', '.join(loaded) or '无'}")
+
+
+if __name__ == "__main__":
+    main()
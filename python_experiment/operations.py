@@ -0,0 +1,327 @@
+"""图像操作注册表与流水线
+
+各实验模块用 register 把处理函数登记为带类型参数的命名操作，界面按名称调用 run_operation，
+Pipeline 把多个操作串成一次处理（例如 灰度化 → 高斯滤波 → Canny → 闭运算），对大量图片逐张整条执行，
+中间结果写进每个线程各自复用的缓冲区，同一数组的灰度图只转换一次。
+
+命令行示例：
+    python operations.py --list
+    python operations.py examples/*.jpg -s gray gaussian_blur:ksize=5 canny:threshold1=50,threshold2=150 closing -o out
+"""
+import argparse
+import glob
+import importlib
+import inspect
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from image_cache import derived_cache
+
+# 提供操作的模块，命令行或流水线需要全部操作时才导入
+OPERATION_MODULES = ("basic", "Threshold_and_Smoothing", "Mathematical_morphology", "image_grad", "image_change",
+                     "Template_matching")
+
+REGISTRY = {}  # 操作名 -> Operation
+_LABELS = {}  # 界面上的中文名 -> 操作名
+
+
+def size(value):
+    """核大小参数：5、(5, 3)、"5" 或 "5x3" 都可以"""
+    if isinstance(value, str):
+        parts = [int(v) for v in value.lower().split("x")]
+        return (parts[0], parts[-1])
+    if isinstance(value, (tuple, list)):
+        return (int(value[0]), int(value[-1]))
+    return (int(value), int(value))
+
+
+def boolean(value):
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+class Param:
+    """操作的一个参数：名称、类型转换函数、默认值和可选值"""
+
+    def __init__(self, name, type=float, default=None, choices=None, help=""):
+        self.name = name
+        self.type = type
+        self.default = default
+        self.choices = choices
+        self.help = help
+
+    def convert(self, value):
+        value = self.type(value)
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"参数 {self.name} 只能取 {'、'.join(map(str, self.choices))}")
+        return value
+
+
+class Operation:
+    """注册表中的一个操作。
+
+    input 为 "gray" 时输入的彩色图会先转成灰度；处理函数带 dst 或 out 参数时，
+    流水线会把上一张图片同一步骤的输出数组传进去复用。
+    """
+
+    def __init__(self, name, func, params=(), input="any", label=None):
+        self.name = name
+        self.func = func
+        self.params = {p.name: p for p in params}
+        self.input = input
+        self.label = label or name
+        arguments = inspect.signature(func).parameters
+        self.dst_arg = next((a for a in ("dst", "out") if a in arguments), None)
+
+    def bind(self, **params):
+        """校验并转换参数，未给出的取默认值"""
+        unknown = set(params) - set(self.params)
+        if unknown:
+            raise ValueError(f"操作 {self.name} 没有参数 {'、'.join(sorted(unknown))}")
+        return {name: p.convert(params[name]) if name in params else p.default for name, p in self.params.items()}
+
+    def __call__(self, image, dst=None, **bound):
+        # OpenCV 的 dst 尺寸或类型不对时会重新分配；out 参数按 numpy 的约定只接受与输入同形状同类型的数组
+        if dst is not None and (self.dst_arg == "dst" or
+                                self.dst_arg == "out" and (dst.shape, dst.dtype) == (image.shape, image.dtype)):
+            bound[self.dst_arg] = dst
+        return self.func(image, **bound)
+
+    def describe(self):
+        params = ", ".join(f"{p.name}={p.default}" for p in self.params.values())
+        label = f"（{self.label}）" if self.label != self.name else ""
+        return f"{self.name}{label}: {params or '无参数'}{'，输入灰度图' if self.input == 'gray' else ''}"
+
+
+def register(name, *params, input="any", label=None):
+    """装饰器：把处理函数登记为名为 name 的操作，label 为界面上使用的名称"""
+    def decorator(func):
+        REGISTRY[name] = Operation(name, func, params, input, label)
+        if label:
+            _LABELS[label] = name
+        return func
+    return decorator
+
+
+def get_operation(name):
+    """按操作名或界面名取操作"""
+    operation = REGISTRY.get(name) or REGISTRY.get(_LABELS.get(name))
+    if operation is None:
+        raise ValueError(f"未知操作：{name}")
+    return operation
+
+
+def load_all():
+    """导入所有提供操作的模块，使注册表完整"""
+    for module in OPERATION_MODULES:
+        importlib.import_module(module)
+    return REGISTRY
+
+
+class GrayCache:
+    """按数组对象缓存灰度图，同一次处理中多个步骤需要同一数组的灰度图时只转换一次。
+
+    流水线的缓冲区会被下一张图片原地覆盖，所以每处理完一张就清空；流水线执行期间 derived_cache 被绕过，
+    各操作内部也不会读到按缓冲区对象缓存的旧结果。
+    """
+
+    def __init__(self):
+        self._grays = {}
+
+    def gray(self, image, dst=None):
+        if image.ndim == 2:
+            return image
+        key = id(image)
+        if key not in self._grays:
+            self._grays[key] = (image, cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=dst))  # 保留原数组，防止 id 被复用
+        return self._grays[key][1]
+
+    def clear(self):
+        self._grays.clear()
+
+
+def run_operation(name, image, cache=derived_cache, **params):
+    """按名称执行一个操作，input 为 gray 的操作先从 cache（默认为按图像的派生数据缓存）取灰度图"""
+    operation = get_operation(name)
+    if operation.input == "gray":
+        image = cache.gray(image)
+    return operation(image, **operation.bind(**params))
+
+
+@register("gray", label="灰度化")
+def to_gray(image, dst=None):
+    """BGR 转灰度，已经是灰度图时原样返回"""
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=dst)
+
+
+def parse_step(spec):
+    """把 "name:k=v,k=v" 解析为 (操作名, 参数字典)"""
+    name, _, rest = spec.partition(":")
+    params = dict(item.split("=", 1) for item in rest.split(",") if item)
+    return name.strip(), {k.strip(): v.strip() for k, v in params.items()}
+
+
+class Pipeline:
+    """按顺序执行多个操作。
+
+    steps 为 [(操作名, 参数字典)] 或 "name:k=v" 字符串列表，参数在构造时就完成校验和类型转换。
+    每个线程为每个步骤保留一个输出缓冲区，尺寸不变时下一张图片直接写进去，
+    因此 run 返回的数组会被同一线程的下一次 run 覆盖，需要保留时请复制。
+    执行期间绕过 derived_cache：它的版本戳只采样部分像素，发现不了缓冲区被整张换成另一张图片。
+    """
+
+    def __init__(self, steps):
+        self.steps = []
+        for step in steps:
+            name, params = parse_step(step) if isinstance(step, str) else step
+            operation = get_operation(name)
+            self.steps.append((operation, operation.bind(**params)))
+        self._local = threading.local()
+
+    def __repr__(self):
+        return " → ".join(operation.name for operation, _ in self.steps)
+
+    def run(self, image):
+        local = self._local
+        if not hasattr(local, "buffers"):
+            local.buffers, local.cache = [None] * len(self.steps), GrayCache()
+        current = image
+        with derived_cache.bypass():
+            current = self._run_steps(local, image)
+        local.cache.clear()
+        return current
+
+    def _run_steps(self, local, image):
+        current = image
+        for i, (operation, params) in enumerate(self.steps):
+            if operation.input == "gray":
+                current = local.cache.gray(current)
+            buffer = local.buffers[i]
+            # 缓冲区不能和输入是同一块内存（原地滤波结果会出错），尺寸不对时 OpenCV 会重新分配
+            if buffer is not None and np.may_share_memory(buffer, current):
+                buffer = None
+            if buffer is not None:
+                derived_cache.invalidate(buffer)  # 缓冲区即将被新图片覆盖，丢掉按对象缓存的旧派生结果
+            result = operation(current, buffer, **params)
+            # 只把本步骤自己分配的数组留作缓冲区：原样返回的输入（例如已经是灰度图时的 gray）
+            # 或它的视图属于调用方，只读的缓存结果也不能被下一张图片覆盖
+            owned = (result.flags.writeable and not np.may_share_memory(result, current)
+                     and not np.may_share_memory(result, image))
+            local.buffers[i] = result if owned else None
+            current = result
+        return current
+
+    def run_many(self, images, workers=None):
+        """对多张图片（数组或路径）并行执行整条流水线，按输入顺序逐个产出结果的副本"""
+        def job(item):
+            image = cv2.imread(item) if isinstance(item, str) else item
+            if image is None:
+                raise ValueError(f"无法读取图片：{item}")
+            return self.run(image).copy()
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            yield from pool.map(job, images)
+
+
+def benchmark_pipeline(pipeline, images, repeat=3):
+    """比较逐步调用 run_operation（每步都新分配结果、重新转灰度）与 Pipeline.run 的耗时"""
+    def stepwise(image):
+        current = image
+        for operation, params in pipeline.steps:
+            current = run_operation(operation.name, current, **params)
+        return current
+
+    same = all(np.array_equal(stepwise(img), pipeline.run(img)) for img in images)
+    for name, fn in (("逐步调用", stepwise), ("流水线", pipeline.run)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for img in images:
+                fn(img)
+        elapsed = (time.perf_counter() - start) / (repeat * len(images))
+        print(f"  {name}: {elapsed * 1000:.2f} ms/张")
+    print(f"  两种方式结果{'一致' if same else '不一致'}")
+
+
+# 内部使用 derived_cache 的操作组成的流水线，用于检查流水线不会返回上一张图片的结果
+CACHE_CHECK_STEPS = (["gray", "gray_hist"], ["brightness_contrast", "color_hist"], ["gray", "clahe"],
+                     ["gray", "fourier"], ["brightness_contrast", "low_pass"], ["gray", "high_pass"],
+                     ["gray", "blur"])
+
+
+def check_pipeline_caches(image, steps_list=CACHE_CHECK_STEPS):
+    """把两张尺寸相同的不同图片交替送入各条流水线，与逐步调用 run_operation 的结果比较。
+
+    第二张图与 image 在 version_stamp 的采样点上完全相同，只有采样点之外的像素不同；
+    另外检查输入已是灰度图时流水线不会把调用方的数组当作缓冲区改写。返回是否全部一致。
+    """
+    other = 255 - image
+    other[::max(1, image.shape[0] // 64), ::max(1, image.shape[1] // 64)] = \
+        image[::max(1, image.shape[0] // 64), ::max(1, image.shape[1] // 64)]
+    gray = to_gray(image).copy()
+    ok = True
+    for steps in steps_list:
+        pipeline = Pipeline(steps)
+        for name, img in (("图1", image), ("图2", other), ("图1", image), ("灰度图", gray), ("图2", other)):
+            expected = img.copy()
+            for operation, params in pipeline.steps:
+                expected = run_operation(operation.name, expected.copy(), **params)
+            before = img.copy()
+            same = np.array_equal(pipeline.run(img), expected) and np.array_equal(img, before)
+            if not same:
+                print(f"  {pipeline}：{name} 的结果不正确")
+            ok &= same
+    print(f"  流水线缓存检查{'通过' if ok else '失败'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按流水线批量处理图片")
+    parser.add_argument("images", nargs="*", help="图片文件或目录")
+    parser.add_argument("-s", "--steps", nargs="+", default=[], help='处理步骤，如 gray gaussian_blur:ksize=5 "canny:threshold1=50,threshold2=150" closing')
+    parser.add_argument("-o", "--output", help="结果输出目录")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="线程数，默认使用全部 CPU 核心")
+    parser.add_argument("--list", action="store_true", help="列出所有已注册的操作")
+    parser.add_argument("--benchmark", action="store_true", help="比较逐步调用与流水线的耗时")
+    parser.add_argument("--check", action="store_true", help="检查流水线复用缓冲区时不会返回上一张图片的结果")
+    args = parser.parse_args()
+
+    load_all()
+    if args.check:
+        ok = check_pipeline_caches(cv2.imread(args.images[0] if args.images else "examples/lenna.jpg"))
+        raise SystemExit(0 if ok else 1)
+    if args.list or not args.steps:
+        for operation in REGISTRY.values():
+            print(operation.describe())
+        return
+    paths = []
+    for item in args.images:
+        if os.path.isdir(item):
+            paths += sorted(p for p in glob.glob(os.path.join(item, "*"))
+                            if p.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+        else:
+            paths.append(item)
+    pipeline = Pipeline(args.steps)
+    print(f"流水线：{pipeline}")
+    if args.benchmark:
+        benchmark_pipeline(pipeline, [cv2.imread(p) for p in paths])
+        return
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    start = time.perf_counter()
+    for path, result in zip(paths, pipeline.run_many(paths, args.workers)):
+        if args.output:
+            cv2.imwrite(os.path.join(args.output, os.path.basename(path)), result)
+    elapsed = time.perf_counter() - start
+    print(f"共处理 {len(paths)} 张图片，用时 {elapsed:.2f} 秒，{len(paths) / max(elapsed, 1e-9):.1f} 张/秒")
+
+
+if __name__ == "__main__":
+    # 以脚本运行时各模块注册到的是导入的 operations 模块，而不是这里的 __main__
+    import operations
+    operations.main()
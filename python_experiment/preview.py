@@ -0,0 +1,131 @@
+"""各个实验界面共用的图像预览组件
+
+把 OpenCV 图像显示到 Tk 的 Label 或 Canvas 上：缩放和颜色转换的结果按 (图像内容, 显示区域) 缓存，
+同一个 PhotoImage 通过 paste 反复复用，内容没有变化时直接跳过。
+"""
+import time
+import zlib
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import tkinter as tk
+from PIL import Image, ImageTk
+
+
+def fit_size(shape, max_size):
+    """按比例缩小到 max_size=(宽, 高) 以内，不放大；max_size 为 None 时保持原尺寸"""
+    height, width = shape[:2]
+    if max_size is None:
+        return width, height
+    scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def content_key(image):
+    """图像内容的指纹：形状、类型加上全部像素的 CRC32，原地修改、翻转、平移过的数组都能区分。
+
+    CRC32 与字节顺序有关（异或、求和之类的指纹对翻转和循环平移不敏感），
+    只需顺序读一遍内存，大图上也小于缩放和颜色转换的开销。
+    """
+    return image.shape, image.dtype.str, zlib.crc32(memoryview(np.ascontiguousarray(image)).cast("B"))
+
+
+def to_pil(image, size):
+    """缩放（INTER_AREA）并把 BGR 转成 RGB，灰度图保持单通道"""
+    if image.shape[1::-1] != size:
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return Image.fromarray(image)
+
+
+class ImagePreview:
+    """显示在一个 Label 或 Canvas 上的图像预览。
+
+    max_size 为最大显示尺寸 (宽, 高)，None 表示按原尺寸显示；
+    title_label 给出时 show 的 title 会写到这个标签上。
+    cache_size 为 0 时不计算内容指纹也不缓存，用于每帧都不同的视频显示。
+    """
+
+    def __init__(self, widget, max_size=(600, 400), title_label=None, cache_size=8):
+        self.widget = widget
+        self.max_size = max_size
+        self.title_label = title_label
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (内容, 显示尺寸) -> 转换好的 PIL 图像
+        self._photo = None
+        self._photo_mode = None  # PhotoImage 创建时的模式，paste 会把图像转换成这个模式
+        self._item = None  # Canvas 上的图像项
+        self._shown = None
+
+    def show(self, image, title=None):
+        """显示 image，内容和显示区域都没变时不做任何转换，返回是否真正刷新了画面"""
+        if title is not None and self.title_label is not None:
+            self.title_label.config(text=title)
+        if not self.cache_size:
+            self._paste(to_pil(image, fit_size(image.shape, self.max_size)))
+            return True
+        key = content_key(image), self.max_size
+        if key == self._shown:
+            return False
+        pil_image = self._cache.get(key)
+        if pil_image is None:
+            pil_image = self._cache[key] = to_pil(image, fit_size(image.shape, self.max_size))
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        self._paste(pil_image)
+        self._shown = key
+        return True
+
+    def _paste(self, pil_image):
+        if (self._photo is not None and (self._photo.width(), self._photo.height()) == pil_image.size
+                and self._photo_mode == pil_image.mode):
+            self._photo.paste(pil_image)  # 尺寸和模式（灰度/彩色）都不变时直接写进已有的 PhotoImage
+            return
+        self._photo = ImageTk.PhotoImage(pil_image)
+        self._photo_mode = pil_image.mode
+        if isinstance(self.widget, tk.Canvas):
+            if self._item is None:
+                self._item = self.widget.create_image(0, 0, anchor=tk.NW, image=self._photo)
+            else:
+                self.widget.itemconfig(self._item, image=self._photo)
+        else:
+            self.widget.config(image=self._photo)
+        self.widget.image = self._photo  # 保持对图像的引用，防止被垃圾回收
+
+    def clear(self):
+        self._cache.clear()
+        self._shown = None
+
+
+def benchmark_preview(frames=300, size=(640, 480)):
+    """比较每帧新建 PhotoImage/画布图像项与复用同一个 PhotoImage 的显示帧率（需要图形界面）"""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    video = [np.roll(base, i * 4, axis=1) for i in range(30)]
+
+    root = tk.Tk()
+    canvas = tk.Canvas(root, width=size[0], height=size[1])
+    canvas.pack()
+
+    def legacy(frame):
+        frame_tk = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        canvas.create_image(0, 0, anchor=tk.NW, image=frame_tk)
+        canvas.image = frame_tk
+
+    preview = ImagePreview(canvas, None, cache_size=0)
+    for name, show in (("每帧新建", legacy), ("复用 PhotoImage", preview.show)):
+        canvas.delete("all")
+        start = time.perf_counter()
+        for i in range(frames):
+            show(video[i % len(video)])
+            root.update()
+        print(f"  {name}: {frames / (time.perf_counter() - start):.1f} 帧/秒，画布图像项 {len(canvas.find_all())} 个")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    benchmark_preview()